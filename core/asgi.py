@@ -10,7 +10,6 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 import os
 from django.core.asgi import get_asgi_application
 from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
 from channels.security.websocket import AllowedHostsOriginValidator
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
@@ -20,17 +19,18 @@ django_asgi_app = get_asgi_application()
 
 # Import routing after Django initialization
 from projects import routing
+from core.websocket_auth import JWTAuthMiddlewareStack
 
 application = ProtocolTypeRouter({
     "http": django_asgi_app,
     # "websocket": AllowedHostsOriginValidator(
-    #     AuthMiddlewareStack(
+    #     JWTAuthMiddlewareStack(
     #         URLRouter(
     #             routing.websocket_urlpatterns
     #         )
     #     )
     # ),
-    "websocket": AuthMiddlewareStack(
+    "websocket": JWTAuthMiddlewareStack(
     URLRouter(
         routing.websocket_urlpatterns
     )
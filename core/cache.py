@@ -0,0 +1,312 @@
+"""
+Two-tier cache: a per-process LRU in front of a Redis cache alias
+
+Hot, rarely changing values (user profiles, membership scopes, feed
+generation counters and pages) are read on nearly every request. A
+TwoTierCache keeps recently used values in process memory for a few
+seconds, so repeated reads cost no network round trip at all, and falls
+back to the Django cache alias behind it.
+
+Writes and deletes go to Redis and publish the key on a pub/sub channel.
+A daemon thread per process and alias listens on that channel and drops
+local copies, so other workers see changes within milliseconds. The local
+TTL bounds staleness when a message is missed (e.g. while the listener
+reconnects). Values are shared between callers; treat them as read-only.
+
+get_or_fill() protects expensive values from cache stampedes: one caller
+per key recomputes (single flight), entries are refreshed a little before
+they expire with a probability that grows as expiry nears (XFetch), and
+while one caller refreshes an expired entry the others keep serving it
+for up to CACHE_STALE_TTL seconds.
+"""
+import math
+import os
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+LOCAL_CACHE_TTL = getattr(settings, 'LOCAL_CACHE_TTL', 5)
+LOCAL_CACHE_MAX_ENTRIES = getattr(settings, 'LOCAL_CACHE_MAX_ENTRIES', 1024)
+INVALIDATION_CHANNEL = 'cache:invalidate'
+CACHE_STALE_TTL = getattr(settings, 'CACHE_STALE_TTL', 60)
+CACHE_FILL_LOCK_TIMEOUT = getattr(settings, 'CACHE_FILL_LOCK_TIMEOUT', 10)
+CACHE_FILL_WAIT = getattr(settings, 'CACHE_FILL_WAIT', 3)
+CACHE_FILL_POLL_INTERVAL = 0.05
+# Higher values refresh earlier; 1.0 is the XFetch paper's default
+XFETCH_BETA = getattr(settings, 'XFETCH_BETA', 1.0)
+
+# Delete a fill lock only if it still holds our token. KEYS = lock; ARGV = token
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# name -> TwoTierCache, for routing invalidation messages
+_registry = {}
+# alias -> PID of the process whose listener thread is running
+_listeners = {}
+_listeners_lock = threading.Lock()
+_origin = (None, None)
+
+
+def origin():
+    """ID of this process in invalidation messages, renewed after a fork"""
+    global _origin
+    if _origin[0] != os.getpid():
+        _origin = (os.getpid(), uuid.uuid4().hex)
+    return _origin[1]
+
+
+class TwoTierCache:
+    """
+    A bounded LRU with a short TTL in front of a Django cache alias
+
+    `name` namespaces invalidation messages and must be unique per process.
+    """
+
+    def __init__(self, name, alias='default', local_ttl=LOCAL_CACHE_TTL,
+                 max_entries=LOCAL_CACHE_MAX_ENTRIES):
+        self.name = name
+        self.alias = alias
+        self.local_ttl = local_ttl
+        self.max_entries = max_entries
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        _registry[name] = self
+
+    @property
+    def remote(self):
+        return caches[self.alias]
+
+    def get_local(self, key):
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._local[key]
+                return None
+            self._local.move_to_end(key)
+            return entry[1]
+
+    def set_local(self, key, value):
+        with self._lock:
+            self._local[key] = (time.monotonic() + self.local_ttl, value)
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_entries:
+                self._local.popitem(last=False)
+
+    def drop_local(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._local.pop(key, None)
+
+    def clear_local(self):
+        with self._lock:
+            self._local.clear()
+
+    def get(self, key, default=None):
+        value = self.get_local(key)
+        if value is not None:
+            return value
+
+        start_listener(self.alias)
+        value = self.remote.get(key)
+        if value is None:
+            return default
+        self.set_local(key, value)
+        return value
+
+    def get_many(self, keys):
+        """Like cache.get_many(), fetching only the local misses from Redis"""
+        found = {}
+        for key in keys:
+            value = self.get_local(key)
+            if value is not None:
+                found[key] = value
+
+        missing = [key for key in keys if key not in found]
+        if missing:
+            start_listener(self.alias)
+            for key, value in self.remote.get_many(missing).items():
+                self.set_local(key, value)
+                found[key] = value
+        return found
+
+    def set(self, key, value, timeout):
+        self.remote.set(key, value, timeout)
+        self.invalidate(key)
+        self.set_local(key, value)
+
+    def add(self, key, value, timeout):
+        """Set `key` only if it does not exist yet; return whether it was set"""
+        added = self.remote.add(key, value, timeout)
+        if added:
+            self.set_local(key, value)
+        return added
+
+    def incr(self, key):
+        value = self.remote.incr(key)
+        self.invalidate(key)
+        return value
+
+    def delete(self, key):
+        self.remote.delete(key)
+        self.invalidate(key)
+
+    def invalidate(self, *keys):
+        """Drop local copies here and, via pub/sub, in every other process"""
+        self.drop_local(*keys)
+        try:
+            pipe = get_redis_connection(self.alias).pipeline(transaction=False)
+            for key in keys:
+                pipe.publish(INVALIDATION_CHANNEL, f'{origin()}:{self.name}:{key}')
+            pipe.execute()
+        except RedisError:
+            # Other processes fall back on the local TTL
+            pass
+
+    def get_or_fill(self, key, fill, timeout, stale_ttl=CACHE_STALE_TTL, beta=XFETCH_BETA):
+        """
+        Return the value cached under `key`, computing it with fill() when
+        it is missing, expired or picked for early refresh
+
+        Only the caller holding the key's fill lock runs fill(). The others
+        serve the current entry if there is one, or wait up to
+        CACHE_FILL_WAIT seconds for the result. After that a waiter takes
+        over the lock if its holder is gone, and only computes the value
+        without storing it while the original fill is still running.
+        """
+        entry = self.get_entry(key)
+        if entry is not None and not needs_refresh(entry, beta):
+            return entry['value']
+
+        token = self.acquire_fill_lock(key)
+        if token is None:
+            if entry is not None:
+                # Stale while revalidate: someone else is refreshing it
+                return entry['value']
+            entry = self.wait_for_fill(key)
+            if entry is not None:
+                return entry['value']
+            token = self.acquire_fill_lock(key)
+            if token is None:
+                return fill()
+
+        try:
+            return self.fill(key, fill, timeout, stale_ttl)
+        finally:
+            self.release_fill_lock(key, token)
+
+    def get_entry(self, key):
+        entry = self.get(key)
+        if not (isinstance(entry, dict) and 'expires' in entry):
+            # Missing, or written by plain set() before get_or_fill() was used
+            return None
+        return entry
+
+    def fill(self, key, fill, timeout, stale_ttl):
+        start = time.monotonic()
+        value = fill()
+        entry = {
+            'value': value,
+            'expires': time.time() + timeout,
+            # How long the value took to compute, which scales early refresh
+            'delta': time.monotonic() - start,
+        }
+        self.set(key, entry, timeout + stale_ttl)
+        return value
+
+    def fill_lock_key(self, key):
+        return f'fill-lock:{self.name}:{key}'
+
+    def acquire_fill_lock(self, key):
+        """Return a token when this caller may fill `key`, otherwise None"""
+        token = uuid.uuid4().hex
+        try:
+            acquired = get_redis_connection(self.alias).set(
+                self.fill_lock_key(key), token, nx=True, px=CACHE_FILL_LOCK_TIMEOUT * 1000
+            )
+        except RedisError:
+            # Without Redis there is nothing to coordinate on
+            return token
+        return token if acquired else None
+
+    def release_fill_lock(self, key, token):
+        try:
+            con = get_redis_connection(self.alias)
+            con.register_script(RELEASE_LOCK_SCRIPT)(keys=[self.fill_lock_key(key)], args=[token])
+        except RedisError:
+            # The lock expires on its own
+            pass
+
+    def wait_for_fill(self, key):
+        deadline = time.monotonic() + CACHE_FILL_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(CACHE_FILL_POLL_INTERVAL)
+            entry = self.get_entry(key)
+            if entry is not None:
+                return entry
+        # One last look, for a fill that finished right at the deadline
+        return self.get_entry(key)
+
+
+def needs_refresh(entry, beta=XFETCH_BETA):
+    """
+    XFetch: True once the entry has expired, and increasingly often as its
+    expiry approaches, earlier for values that are slow to compute
+    """
+    jitter = -entry['delta'] * beta * math.log(1 - random.random())
+    return time.time() + jitter >= entry['expires']
+
+
+def clear_local(alias):
+    for cache in list(_registry.values()):
+        if cache.alias == alias:
+            cache.clear_local()
+
+
+def listen(alias):
+    """Apply invalidation messages for `alias` until the process exits"""
+    while True:
+        try:
+            pubsub = get_redis_connection(alias).pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(INVALIDATION_CHANNEL)
+            # Anything cached before the subscription may have missed a message
+            clear_local(alias)
+            for message in pubsub.listen():
+                sender, name, key = message['data'].decode().split(':', 2)
+                if sender == origin():
+                    # Dropped locally when it was sent
+                    continue
+                cache = _registry.get(name)
+                if cache is not None and cache.alias == alias:
+                    cache.drop_local(key)
+        except RedisError:
+            clear_local(alias)
+            time.sleep(1)
+
+
+def start_listener(alias):
+    """Start this process's invalidation listener for `alias`, once per fork"""
+    pid = os.getpid()
+    if _listeners.get(alias) == pid:
+        return
+    with _listeners_lock:
+        if _listeners.get(alias) == pid:
+            return
+        _listeners[alias] = pid
+        threading.Thread(
+            target=listen,
+            args=(alias,),
+            name=f'cache-invalidation-{alias}',
+            daemon=True,
+        ).start()
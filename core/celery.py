@@ -24,6 +24,18 @@ app.conf.beat_schedule = {
         'task': 'projects.tasks.cleanup_old_activities',
         'schedule': crontab(hour=2, minute=0),  # Every day at 2 AM
     },
+    'create-future-partitions': {
+        'task': 'projects.tasks.create_future_partitions',
+        'schedule': crontab(hour=1, minute=0),  # Every day at 1 AM
+    },
+    'send-due-date-reminders': {
+        'task': 'projects.tasks.send_due_date_reminders',
+        'schedule': crontab(minute=0),  # Every hour
+    },
+    'drain-outbox': {
+        'task': 'projects.tasks.drain_outbox',
+        'schedule': 2.0,  # Every 2 seconds
+    },
 }
 
 @app.task(bind=True)
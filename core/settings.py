@@ -67,6 +67,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'projects.middleware.BroadcastBatchMiddleware',
 ]
 
 ROOT_URLCONF = 'core.urls'
@@ -161,17 +162,24 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle',
+        'core.throttling.AnonRateThrottle',
+        'core.throttling.UserRateThrottle',
     ],
     'DEFAULT_THROTTLE_RATES': {
         'anon': '100/hour',      # Anonymous users: 100 requests per hour
         'user': '1000/hour',     # Authenticated users: 1000 requests per hour
         'login': '5/minute',     # Login attempts: 5 per minute
         'comment': '30/hour',    # Comments: 30 per hour
+        'organization': '10000/hour',  # Per organization, on views that opt in
+        'burst': '60/minute',    # Sustained rate of BurstRateThrottle
     }
 }
 
+# Token bucket sizes: requests that may pass at once before the rate applies
+THROTTLE_BURSTS = {
+    'burst': 20,
+}
+
 # JWT Configuration
 from datetime import timedelta
 
@@ -199,12 +207,23 @@ CACHES = {
         'LOCATION': 'redis://127.0.0.1:6379/2',  # Database 2 for feed cache
         'OPTIONS': {
             'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            # Feed pages are plain JSON data; see projects.feed_cache
+            'SERIALIZER': 'django_redis.serializers.json.JSONSerializer',
+            'COMPRESSOR': 'django_redis.compressors.zlib.ZlibCompressor',
         },
         'KEY_PREFIX': 'feed',
         'TIMEOUT': 600,  # 10 minutes for feed
     }
 }
 
+# Per-process layer of core.cache.TwoTierCache, invalidated over pub/sub
+LOCAL_CACHE_TTL = 5
+LOCAL_CACHE_MAX_ENTRIES = 1024
+# Stampede protection for get_or_fill(): seconds an expired entry may still be
+# served while one request refreshes it, and how long that refresh may take
+CACHE_STALE_TTL = 60
+CACHE_FILL_LOCK_TIMEOUT = 10
+
 # Session storage in Redis (optional but recommended)
 SESSION_ENGINE = 'django.contrib.sessions.backends.cache'
 SESSION_CACHE_ALIAS = 'default'
@@ -257,4 +276,41 @@ CHANNEL_LAYERS = {
             "hosts": [('127.0.0.1', 6379)],
         },
     },
-}
\ No newline at end of file
+}
+
+# Feed timelines (fan-out on write, stored on the 'feed' cache alias)
+FEED_TIMELINE_MAX_LENGTH = 1000  # Newest feed IDs kept per timeline
+FEED_TIMELINE_TTL = 60 * 60 * 24  # Idle timelines expire after a day
+FEED_GENERATION_TTL = 60 * 60 * 24  # Feed cache generation counters, longer than any cached page
+
+# Transactional outbox (drained by projects.tasks.drain_outbox)
+OUTBOX_BATCH_SIZE = 500  # Events turned into bulk inserts per transaction
+
+# Read project task counts from denormalized Project counters instead of
+# annotating them (run `manage.py refresh_task_counts` before enabling)
+PROJECT_TASK_COUNTERS = False
+
+# Notification email (projects.mail): messages sent per chunk on one connection
+MAIL_CHUNK_SIZE = 100
+
+# Retention purge (projects.retention), run by cleanup_old_activities.
+# Per table, with optional per-organization overrides; days=None keeps forever
+RETENTION_POLICIES = {
+    'activity_logs': {'days': 90, 'organizations': {}},
+    'feeds': {'days': 90, 'organizations': {}},
+}
+RETENTION_BATCH_SIZE = 1000  # Rows deleted per statement
+RETENTION_BATCH_PAUSE = 0.1  # Seconds to sleep between batches
+RETENTION_MAX_SECONDS = 20 * 60  # Time budget per run, below the task soft limit
+
+# Monthly partitions of feeds/activity_logs (manage.py partition_tables)
+PARTITION_MONTHS_AHEAD = 3  # Future partitions kept ready by beat
+
+# Task room presence (projects.presence)
+PRESENCE_TICK = 1.0  # Seconds between coalesced presence_update messages
+PRESENCE_HEARTBEAT = 15  # Seconds between socket heartbeats
+PRESENCE_TTL = 45  # Sockets silent this long count as gone
+TYPING_INTERVAL = 3.0  # A user's typing is recorded at most this often
+
+# Live feed sockets: updates arriving within this many seconds share one frame
+FEED_BATCH_WINDOW = 0.25
@@ -0,0 +1,87 @@
+from unittest import mock
+from django.test import SimpleTestCase, TestCase
+from django_redis import get_redis_connection
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from users.models import CustomUser
+from .cache import TwoTierCache
+from .throttling import BurstRateThrottle, UserRateThrottle, get_connection
+
+
+class WindowThrottle(UserRateThrottle):
+    scope = 'test_window'
+    rate = '3/minute'
+
+
+class BucketThrottle(BurstRateThrottle):
+    scope = 'test_bucket'
+    rate = '60/minute'
+    burst = 2
+
+
+class RedisThrottleTests(TestCase):
+    """The Lua throttles admit `limit` requests, then report how long to wait"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('owner@example.com', 'password')
+        self.request = Request(APIRequestFactory().get('/'))
+        self.request.user = self.user
+        self.now = 1_000_000.0
+        for throttle_class in (WindowThrottle, BucketThrottle):
+            key = throttle_class().get_cache_key(self.request, None)
+            get_connection().delete(key)
+            self.addCleanup(get_connection().delete, key)
+
+    def check(self, throttle_class, at):
+        throttle = throttle_class()
+        throttle.timer = lambda: self.now + at
+        return throttle.allow_request(self.request, None), throttle.wait()
+
+    def test_sliding_window(self):
+        for at in (0, 1, 2):
+            self.assertEqual(self.check(WindowThrottle, at), (True, 0))
+
+        # Request 4 waits for the first one to leave the window
+        self.assertEqual(self.check(WindowThrottle, 3), (False, 57))
+        self.assertEqual(self.check(WindowThrottle, 60)[0], True)
+        self.assertEqual(self.check(WindowThrottle, 60.5)[0], False)
+
+    def test_token_bucket(self):
+        self.assertEqual(self.check(BucketThrottle, 0), (True, 0))
+        self.assertEqual(self.check(BucketThrottle, 0.001), (True, 0))
+
+        # The burst is spent; tokens come back at one per second
+        allowed, wait = self.check(BucketThrottle, 0.002)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(wait, 1, places=1)
+        self.assertEqual(self.check(BucketThrottle, 1.1)[0], True)
+        self.assertEqual(self.check(BucketThrottle, 1.2)[0], False)
+
+
+class GetOrFillTests(SimpleTestCase):
+    """Callers that lose the fill lock do not all compute the value"""
+
+    def setUp(self):
+        self.cache = TwoTierCache('test_get_or_fill')
+        self.key = 'test_get_or_fill_key'
+        self.fill = mock.Mock(return_value='fresh')
+        self.addCleanup(self.cache.delete, self.key)
+        self.addCleanup(get_redis_connection().delete, self.cache.fill_lock_key(self.key))
+        self.cache.delete(self.key)
+
+    def hold_lock(self, milliseconds):
+        get_redis_connection().set(self.cache.fill_lock_key(self.key), 'other', px=milliseconds)
+
+    def test_serves_stale_entry_while_locked(self):
+        self.cache.set(self.key, {'value': 'stale', 'expires': 0, 'delta': 0}, 60)
+        self.hold_lock(10000)
+        self.assertEqual(self.cache.get_or_fill(self.key, self.fill, 60), 'stale')
+        self.fill.assert_not_called()
+
+    @mock.patch('core.cache.CACHE_FILL_WAIT', 0.2)
+    def test_takes_over_an_abandoned_lock(self):
+        # The holder died without storing anything; its lock expires mid-wait
+        self.hold_lock(100)
+        self.assertEqual(self.cache.get_or_fill(self.key, self.fill, 60), 'fresh')
+        self.assertEqual(self.cache.get_or_fill(self.key, self.fill, 60), 'fresh')
+        self.fill.assert_called_once()
@@ -1,4 +1,184 @@
-from rest_framework.throttling import UserRateThrottle, AnonRateThrottle
+"""
+Redis-backed request throttles
+
+DRF's stock throttles keep a list of timestamps per client in the cache,
+so every check reads, rewrites and re-pickles the whole list, and two
+concurrent requests can both pass on the same stale list. The throttles
+here run one Lua script per check instead, which is atomic and costs a
+single round trip:
+
+- SlidingWindowThrottle: an exact sliding window over a sorted set of
+  request timestamps, for 'N/period' rates.
+- TokenBucketThrottle: a bucket of `burst` tokens refilled at the
+  sustained rate, so short bursts pass while the average stays bounded.
+
+Budgets can be kept per user (anonymous requests fall back to the client
+IP) or per organization; the organization budget is opt-in per view, on
+endpoints that name an organization. Throttles fail open when Redis is
+unreachable.
+"""
+import uuid
+from django.conf import settings
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+from rest_framework import throttling
+from organizations.scope import get_request_scope
+
+# Burst sizes of token bucket scopes, e.g. {'burst': 20}
+THROTTLE_BURSTS = getattr(settings, 'THROTTLE_BURSTS', {})
+
+# KEYS = window; ARGV = now (ms), window (ms), limit, member.
+# Returns {allowed, milliseconds until a slot frees up}
+SLIDING_WINDOW_SCRIPT = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+if redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[3]) then
+    redis.call('ZADD', KEYS[1], now, ARGV[4])
+    redis.call('PEXPIRE', KEYS[1], window)
+    return {1, 0}
+end
+local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+return {0, tonumber(oldest[2]) + window - now}
+"""
+
+# KEYS = bucket; ARGV = now (ms), capacity, tokens per ms.
+# Returns {allowed, milliseconds until the next token}
+TOKEN_BUCKET_SCRIPT = """
+local now = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local refill = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * refill)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / refill))
+if allowed == 1 then
+    return {1, 0}
+end
+return {0, math.ceil((1 - tokens) / refill)}
+"""
+
+
+def get_connection():
+    return get_redis_connection('default')
+
+
+class RedisThrottle(throttling.SimpleRateThrottle):
+    """
+    Base for throttles that check and record a request in one script call
+
+    Subclasses implement check(now_ms) returning (allowed, wait in ms), and
+    get_cache_key() as with DRF's throttles; a key of None skips the check.
+    """
+    cache_format = 'throttle:%(scope)s:%(ident)s'
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        try:
+            allowed, self.wait_ms = self.check(int(self.timer() * 1000))
+        except RedisError:
+            # Losing the limiter must not take the API down with it
+            return True
+        return bool(allowed)
+
+    def check(self, now_ms):
+        raise NotImplementedError('.check() must be overridden')
+
+    def wait(self):
+        return max(getattr(self, 'wait_ms', 0), 0) / 1000
+
+
+class SlidingWindowThrottle(RedisThrottle):
+    """Allow num_requests in any `duration` seconds"""
+
+    def check(self, now_ms):
+        return get_connection().register_script(SLIDING_WINDOW_SCRIPT)(
+            keys=[self.key],
+            args=[now_ms, self.duration * 1000, self.num_requests, f'{now_ms}:{uuid.uuid4().hex}'],
+        )
+
+
+class TokenBucketThrottle(RedisThrottle):
+    """
+    Allow bursts of up to `burst` requests, refilled at the scope's rate
+
+    The burst size comes from settings.THROTTLE_BURSTS[scope], falling back
+    to the class attribute and then to the rate's own request count.
+    """
+    burst = None
+
+    def __init__(self):
+        super().__init__()
+        self.burst = THROTTLE_BURSTS.get(self.scope, self.burst) or self.num_requests
+
+    def check(self, now_ms):
+        return get_connection().register_script(TOKEN_BUCKET_SCRIPT)(
+            keys=[self.key],
+            args=[now_ms, self.burst, self.num_requests / (self.duration * 1000)],
+        )
+
+
+class OrganizationThrottleMixin:
+    """
+    Key the budget on an organization, shared by all of its members
+
+    The organization comes from an `organization`, `organization_id` or
+    `org_id` URL kwarg, query parameter or request field. Requests naming
+    an organization the user is not a member of, or none at all, are left
+    to the per-user throttles. Add it to `throttle_classes` of views that
+    act on one organization, next to UserRateThrottle.
+    """
+    ORGANIZATION_FIELDS = ('organization', 'organization_id', 'org_id')
+
+    def get_organization_id(self, request, view):
+        scope = get_request_scope(request)
+        sources = [getattr(view, 'kwargs', {}), request.query_params]
+        if isinstance(request.data, dict):
+            sources.append(request.data)
+
+        for source in sources:
+            for field in self.ORGANIZATION_FIELDS:
+                value = source.get(field)
+                if value is not None:
+                    value = str(value)
+                    if value.isdigit() and scope.role_in(int(value)):
+                        return int(value)
+                    return None
+        return None
+
+    def get_cache_key(self, request, view):
+        if not (request.user and request.user.is_authenticated):
+            return None
+        organization_id = self.get_organization_id(request, view)
+        if organization_id is None:
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': f'org_{organization_id}'}
+
+
+class AnonRateThrottle(SlidingWindowThrottle, throttling.AnonRateThrottle):
+    """Rate limit anonymous requests by client IP"""
+
+
+class UserRateThrottle(SlidingWindowThrottle, throttling.UserRateThrottle):
+    """Rate limit authenticated requests per user"""
+
+
+class OrganizationRateThrottle(OrganizationThrottleMixin, SlidingWindowThrottle):
+    """Rate limit requests per organization"""
+    scope = 'organization'
 
 
 class LoginRateThrottle(AnonRateThrottle):
@@ -15,9 +195,12 @@ class CommentRateThrottle(UserRateThrottle):
     scope = 'comment'
 
 
-class BurstRateThrottle(UserRateThrottle):
+class BurstRateThrottle(TokenBucketThrottle, throttling.UserRateThrottle):
     """
     Allow short bursts of requests (for UI interactions)
+
+    Bursts of up to THROTTLE_BURSTS['burst'] requests pass at once; after
+    that requests are let through at the sustained 'burst' rate.
     """
     scope = 'burst'
-    rate = '60/minute'
\ No newline at end of file
+    burst = 20
@@ -0,0 +1,40 @@
+"""
+JWT authentication for WebSocket connections
+
+The REST API authenticates with simplejwt access tokens, which browsers
+cannot send as headers on a WebSocket handshake, so sockets pass the same
+token as a `?token=` query parameter. Session authentication still applies
+when no token is given.
+"""
+from urllib.parse import parse_qs
+from channels.auth import AuthMiddlewareStack
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+
+@database_sync_to_async
+def get_token_user(raw_token):
+    """Return the active user an access token belongs to, or None"""
+    authentication = JWTAuthentication()
+    try:
+        return authentication.get_user(authentication.get_validated_token(raw_token))
+    except AuthenticationFailed:
+        return None
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """Set scope['user'] from a valid ?token=<access token> query parameter"""
+
+    async def __call__(self, scope, receive, send):
+        token = parse_qs(scope.get('query_string', b'').decode()).get('token')
+        if token:
+            user = await get_token_user(token[0])
+            if user is not None:
+                scope = dict(scope, user=user)
+        return await super().__call__(scope, receive, send)
+
+
+def JWTAuthMiddlewareStack(inner):
+    return AuthMiddlewareStack(JWTAuthMiddleware(inner))
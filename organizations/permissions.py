@@ -1,5 +1,11 @@
 from rest_framework import permissions
-from .models import Membership
+from .models import Organization
+from .scope import get_request_scope
+
+
+def organization_id_of(obj):
+    """Organization ID of an Organization, or of an object that belongs to one"""
+    return obj.id if isinstance(obj, Organization) else obj.organization_id
 
 
 class IsOrganizationAdmin(permissions.BasePermission):
@@ -24,13 +30,8 @@ class IsOrganizationAdmin(permissions.BasePermission):
             return True
         
         # Check if user is ADMIN in this organization
-        membership = Membership.objects.filter(
-            user=request.user,
-            organization=obj if hasattr(obj, 'memberships') else obj.organization,
-            role='ADMIN'
-        ).first()
-        
-        return membership is not None
+        role = get_request_scope(request).role_in(organization_id_of(obj))
+        return role == 'ADMIN'
 
 
 # class IsOrganizationManagerOrAdmin(permissions.BasePermission):
@@ -78,20 +79,13 @@ class IsOrganizationManagerOrAdmin(permissions.BasePermission):
         if request.user.is_superuser:
             return True
         
+        role = get_request_scope(request).role_in(organization_id_of(obj))
+        
         if request.method in permissions.SAFE_METHODS:
-            return Membership.objects.filter(
-                user=request.user,
-                organization=obj if hasattr(obj, 'memberships') else obj.organization
-            ).exists()
+            return role is not None
         
         # Only ADMIN or MANAGER in that organization can modify
-        membership = Membership.objects.filter(
-            user=request.user,
-            organization=obj if hasattr(obj, 'memberships') else obj.organization,
-            role__in=['ADMIN', 'MANAGER']
-        ).first()
-        
-        return membership is not None
+        return role in ['ADMIN', 'MANAGER']
 
 
 class IsOrganizationMember(permissions.BasePermission):
@@ -105,9 +99,4 @@ class IsOrganizationMember(permissions.BasePermission):
             return True
         
         # Check if user is a member in this organization
-        membership = Membership.objects.filter(
-            user=request.user,
-            organization=obj if hasattr(obj, 'memberships') else obj.organization
-        ).first()
-        
-        return membership is not None
\ No newline at end of file
+        return get_request_scope(request).role_in(organization_id_of(obj)) is not None
@@ -0,0 +1,83 @@
+"""
+Resolved membership scope per user
+
+Viewsets and permission classes need the user's organization IDs and roles
+on every request. Instead of re-running Membership queries each time, the
+resolved {org_id: role} map is memoized on the request, and cached in Redis
+with a small per-process layer in front of it (see core.cache). Membership
+changes invalidate both, in every process (see organizations.signals).
+"""
+from core.cache import TwoTierCache
+from .models import Membership
+
+SCOPE_CACHE_TIMEOUT = 60 * 15
+
+scope_cache = TwoTierCache('user_scope')
+
+
+class UserScope:
+    """Organizations a user belongs to and their role in each"""
+
+    def __init__(self, roles, is_superuser=False):
+        self.roles = roles
+        self.is_superuser = is_superuser
+
+    @property
+    def org_ids(self):
+        return sorted(self.roles)
+
+    def role_in(self, organization_id):
+        """Return the user's role in the organization, or None if not a member"""
+        return self.roles.get(organization_id)
+
+    def org_ids_with_role(self, *roles):
+        return sorted(org_id for org_id, role in self.roles.items() if role in roles)
+
+
+def scope_cache_key(user_id):
+    return f'user_scope_{user_id}'
+
+
+def load_user_scope(user):
+    """Build the scope from the database"""
+    roles = dict(
+        Membership.objects.filter(user=user).values_list('organization_id', 'role')
+    )
+    return UserScope(roles, is_superuser=user.is_superuser)
+
+
+def get_user_scope(user):
+    """
+    Return the user's UserScope from process memory, Redis or the database
+    """
+    cache_key = scope_cache_key(user.id)
+    cached = scope_cache.get(cache_key)
+    if cached is not None:
+        return UserScope(cached['roles'], is_superuser=cached['is_superuser'])
+
+    scope = load_user_scope(user)
+    scope_cache.set(
+        cache_key,
+        {'roles': scope.roles, 'is_superuser': scope.is_superuser},
+        SCOPE_CACHE_TIMEOUT
+    )
+    return scope
+
+
+def get_request_scope(request):
+    """
+    Return the scope of the request's user, resolved once per request
+
+    Permission classes and get_queryset all call this, so a request costs
+    at most one Membership query (none when the scope is cached).
+    """
+    scope = getattr(request, '_user_scope', None)
+    if scope is None:
+        scope = get_user_scope(request.user)
+        request._user_scope = scope
+    return scope
+
+
+def invalidate_user_scope(user_id):
+    """Forget a user's cached scope after their memberships change"""
+    scope_cache.delete(scope_cache_key(user_id))
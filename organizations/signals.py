@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Membership
+from .scope import invalidate_user_scope
+
+
+@receiver([post_save, post_delete], sender=Membership)
+def reset_membership_scope(sender, instance, **kwargs):
+    """Drop the cached scope of a user who joined, left or changed role"""
+    invalidate_user_scope(instance.user_id)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def reset_user_scope(sender, instance, created, **kwargs):
+    """The scope caches the superuser flag, so refresh it when a user is saved"""
+    if not created:
+        invalidate_user_scope(instance.id)
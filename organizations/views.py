@@ -4,6 +4,8 @@ from rest_framework.decorators import action
 from .models import Organization, Team, Membership
 from .serializers import OrganizationSerializer, TeamSerializer, MembershipSerializer
 from .permissions import IsOrganizationAdmin, IsOrganizationManagerOrAdmin, IsOrganizationMember
+from .scope import get_request_scope
+from core.throttling import UserRateThrottle, OrganizationRateThrottle
 
 
 class OrganizationViewSet(viewsets.ModelViewSet):
@@ -13,12 +15,11 @@ class OrganizationViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         # Users see only organizations they belong to
-        if self.request.user.is_superuser:
+        scope = get_request_scope(self.request)
+        if scope.is_superuser:
             return Organization.objects.all()
         
-        return Organization.objects.filter(
-            memberships__user=self.request.user
-        ).distinct()
+        return Organization.objects.filter(id__in=scope.org_ids)
     
     def perform_create(self, serializer):
         # Set owner and auto-create membership
@@ -34,17 +35,15 @@ class TeamViewSet(viewsets.ModelViewSet):
     """CRUD for Teams - ADMINs and MANAGERs can create"""
     serializer_class = TeamSerializer
     permission_classes = [IsOrganizationManagerOrAdmin]
+    throttle_classes = [UserRateThrottle, OrganizationRateThrottle]
     
     def get_queryset(self):
         # Users see teams from their organizations
-        if self.request.user.is_superuser:
+        scope = get_request_scope(self.request)
+        if scope.is_superuser:
             return Team.objects.all()
         
-        user_orgs = Membership.objects.filter(
-            user=self.request.user
-        ).values_list('organization', flat=True)
-        
-        return Team.objects.filter(organization__in=user_orgs)
+        return Team.objects.filter(organization_id__in=scope.org_ids)
     
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
@@ -54,18 +53,16 @@ class MembershipViewSet(viewsets.ModelViewSet):
     """Manage organization memberships - ADMIN only"""
     serializer_class = MembershipSerializer
     permission_classes = [IsOrganizationAdmin]
+    throttle_classes = [UserRateThrottle, OrganizationRateThrottle]
     
     def get_queryset(self):
         # Show memberships from user's organizations
-        if self.request.user.is_superuser:
+        scope = get_request_scope(self.request)
+        if scope.is_superuser:
             return Membership.objects.all()
         
-        admin_orgs = Membership.objects.filter(
-            user=self.request.user,
-            role='ADMIN'
-        ).values_list('organization', flat=True)
-        
-        return Membership.objects.filter(organization__in=admin_orgs)
+        admin_orgs = scope.org_ids_with_role('ADMIN')
+        return Membership.objects.filter(organization_id__in=admin_orgs)
     
     def create(self, request, *args, **kwargs):
         # Add user to organization
@@ -0,0 +1,64 @@
+"""
+Task board grouped by status
+
+A board costs two queries whatever the number of tasks: one ordered query
+that numbers each status column's rows with a window function and keeps
+the first `limit + 1` of each, and one GROUP BY for the column totals.
+Each column pages on its own (created_at, id) cursor.
+"""
+from django.db.models import Count, F, Q, Window
+from django.db.models.functions import RowNumber
+from .models import Task
+from .pagination import encode_position, decode_position, after_position
+
+BOARD_COLUMNS = [status for status, _ in Task.STATUS_CHOICES]
+BOARD_COLUMN_LIMIT = 20
+BOARD_MAX_COLUMN_LIMIT = 100
+
+
+def build_board(queryset, columns=BOARD_COLUMNS, limit=BOARD_COLUMN_LIMIT, cursors=None):
+    """
+    Return {status: {'count', 'next_cursor', 'tasks'}} for the given columns
+
+    Args:
+        queryset: Permission-scoped Task queryset (filters and eager loading apply)
+        columns: Statuses to include, in display order
+        limit: Maximum number of tasks per column
+        cursors: {status: cursor} to continue a column after a previous page
+    """
+    cursors = cursors or {}
+
+    column_filter = Q()
+    for status in columns:
+        condition = Q(status=status)
+        if cursors.get(status):
+            condition &= after_position(decode_position(cursors[status]))
+        column_filter |= condition
+
+    ranked = (
+        queryset.filter(column_filter)
+        .annotate(column_rank=Window(
+            RowNumber(),
+            partition_by=F('status'),
+            order_by=(F('created_at').desc(), F('id').desc()),
+        ))
+        .filter(column_rank__lte=limit + 1)
+        .order_by('status', '-created_at', '-id')
+    )
+    counts = dict(
+        queryset.filter(status__in=columns)
+        .order_by()
+        .values_list('status')
+        .annotate(total=Count('id'))
+    )
+
+    board = {status: {'count': counts.get(status, 0), 'next_cursor': None, 'tasks': []} for status in columns}
+    for task in ranked:
+        board[task.status]['tasks'].append(task)
+
+    # The extra row fetched per column only tells us there is another page
+    for column in board.values():
+        if len(column['tasks']) > limit:
+            column['tasks'] = column['tasks'][:limit]
+            column['next_cursor'] = encode_position(column['tasks'][-1])
+    return board
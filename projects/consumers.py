@@ -1,10 +1,22 @@
+import asyncio
 import json
+import time
+from functools import partial
+from asgiref.sync import sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from redis.exceptions import RedisError
+from . import presence
 
 User = get_user_model()
 
+FEED_BATCH_WINDOW = getattr(settings, 'FEED_BATCH_WINDOW', 0.25)
+
+# Redis calls run in worker threads so they never block the event loop
+in_thread = partial(sync_to_async, thread_sensitive=False)
+
 
 class NotificationConsumer(AsyncWebsocketConsumer):
     """
@@ -12,38 +24,30 @@ class NotificationConsumer(AsyncWebsocketConsumer):
     Each user gets their own notification channel
     """
     
-    # async def connect(self):
-    #     """Called when WebSocket connection is established"""
-    #     self.user = self.scope['user']
+    async def connect(self):
+        """Called when WebSocket connection is established"""
+        self.user = self.scope['user']
         
-    #     if self.user.is_anonymous:
-    #         # Reject anonymous users
-    #         await self.close()
-    #     else:
-    #         # Create unique channel name for this user
-    #         self.room_group_name = f'notifications_{self.user.id}'
+        if self.user.is_anonymous:
+            # Reject anonymous users
+            await self.close()
+        else:
+            # Create unique channel name for this user
+            self.room_group_name = f'notifications_{self.user.id}'
             
-    #         # Join room group
-    #         await self.channel_layer.group_add(
-    #             self.room_group_name,
-    #             self.channel_name
-    #         )
+            # Join room group
+            await self.channel_layer.group_add(
+                self.room_group_name,
+                self.channel_name
+            )
             
-    #         await self.accept()
+            await self.accept()
             
-    #         # Send connection success message
-    #         await self.send(text_data=json.dumps({
-    #             'type': 'connection_established',
-    #             'message': 'Connected to notifications'
-    #         }))
-
-    async def connect(self):
-        await self.accept()
-        await self.send(text_data=json.dumps({
-            "type": "connection_established",
-            "message": "Connected (anonymous test)"
-        }))
-    # The above is for testing(test_websocket.html) purposes only. Replace with the commented code for production.
+            # Send connection success message
+            await self.send(text_data=json.dumps({
+                'type': 'connection_established',
+                'message': 'Connected to notifications'
+            }))
     
     async def disconnect(self, close_code):
         """Called when WebSocket connection is closed"""
@@ -70,7 +74,108 @@ class NotificationConsumer(AsyncWebsocketConsumer):
         await self.send(text_data=json.dumps(event['data']))
 
 
-class TaskConsumer(AsyncWebsocketConsumer):
+class TaskPresenceMixin:
+    """
+    Presence and typing for the task rooms a consumer has joined
+    
+    Joins, leaves and typing are recorded in projects.presence and sent to
+    each room as one coalesced presence_update per tick, rather than as a
+    group message per event. A room is only flushed after this socket
+    recorded something in it, or once per heartbeat, so idle rooms cost a
+    heartbeat per socket every PRESENCE_HEARTBEAT seconds and nothing else.
+    Subclasses implement send_presence().
+    """
+    
+    def start_presence(self):
+        self.presence_tasks = set()
+        self.last_typing = {}
+        # Rooms with changes not flushed yet, and their pending flushes
+        self.presence_dirty = set()
+        self.presence_flushes = {}
+        self.presence_ticker = asyncio.ensure_future(self.heartbeat_loop())
+    
+    async def stop_presence(self):
+        ticker = getattr(self, 'presence_ticker', None)
+        if ticker is not None:
+            ticker.cancel()
+        for task_id in list(getattr(self, 'presence_tasks', ())):
+            await self.leave_presence(task_id)
+    
+    async def join_presence(self, task_id):
+        self.presence_tasks.add(task_id)
+        await in_thread(presence.heartbeat)(task_id, self.user, self.channel_name)
+        self.mark_presence_dirty(task_id)
+    
+    async def leave_presence(self, task_id):
+        if task_id not in self.presence_tasks:
+            return
+        self.presence_tasks.discard(task_id)
+        await in_thread(presence.leave)(task_id, self.user.id, self.channel_name)
+        # The flush outlives a disconnecting socket, so the room hears it left
+        self.mark_presence_dirty(task_id)
+    
+    async def mark_typing(self, task_id):
+        """Record typing, at most once per TYPING_INTERVAL per socket and per user"""
+        now = time.monotonic()
+        if now - self.last_typing.get(task_id, 0) < presence.TYPING_INTERVAL:
+            return
+        self.last_typing[task_id] = now
+        if await in_thread(presence.mark_typing)(task_id, self.user.id):
+            self.mark_presence_dirty(task_id)
+    
+    async def get_watchers(self, task_id):
+        return await in_thread(presence.watchers)(task_id)
+    
+    async def heartbeat_loop(self):
+        """Keep this socket's watchers alive and notice watchers that went away"""
+        while True:
+            await asyncio.sleep(presence.PRESENCE_HEARTBEAT)
+            for task_id in list(self.presence_tasks):
+                try:
+                    await in_thread(presence.heartbeat)(task_id, self.user, self.channel_name)
+                except RedisError:
+                    continue
+                self.mark_presence_dirty(task_id)
+    
+    def mark_presence_dirty(self, task_id):
+        """Flush the room's presence changes after the current tick"""
+        self.presence_dirty.add(task_id)
+        if task_id not in self.presence_flushes:
+            self.presence_flushes[task_id] = asyncio.ensure_future(self.flush_presence(task_id))
+    
+    async def flush_presence(self, task_id):
+        try:
+            while task_id in self.presence_dirty:
+                await asyncio.sleep(presence.PRESENCE_TICK)
+                self.presence_dirty.discard(task_id)
+                try:
+                    changes = await in_thread(presence.flush)(task_id)
+                except RedisError:
+                    return
+                
+                if changes == presence.BUSY:
+                    # Another socket is flushing this tick; ours may be newer
+                    self.presence_dirty.add(task_id)
+                elif changes:
+                    await self.channel_layer.group_send(f'task_{task_id}', {
+                        'type': 'presence_update',
+                        'task_id': task_id,
+                        **changes,
+                    })
+        finally:
+            self.presence_flushes.pop(task_id, None)
+    
+    async def presence_update(self, event):
+        """Send a room's coalesced joins, leaves and typing to WebSocket"""
+        await self.send_presence(event['task_id'], {
+            'type': 'presence_update',
+            'joined': event['joined'],
+            'left': event['left'],
+            'typing': event['typing'],
+        })
+
+
+class TaskConsumer(TaskPresenceMixin, AsyncWebsocketConsumer):
     """
     WebSocket consumer for task updates
     Multiple users can watch the same task
@@ -93,28 +198,14 @@ class TaskConsumer(AsyncWebsocketConsumer):
             
             await self.accept()
             
-            # Notify others that user joined
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    'type': 'user_joined',
-                    'user_id': self.user.id,
-                    'user_email': self.user.email,
-                }
-            )
+            # Others hear about the join in the next presence tick
+            self.start_presence()
+            await self.join_presence(self.task_id)
     
     async def disconnect(self, close_code):
         """Disconnect from task channel"""
         if hasattr(self, 'room_group_name'):
-            # Notify others that user left
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    'type': 'user_left',
-                    'user_id': self.user.id,
-                    'user_email': self.user.email,
-                }
-            )
+            await self.stop_presence()
             
             await self.channel_layer.group_discard(
                 self.room_group_name,
@@ -127,15 +218,15 @@ class TaskConsumer(AsyncWebsocketConsumer):
         message_type = data.get('type')
         
         if message_type == 'typing':
-            # Broadcast typing indicator
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    'type': 'typing_indicator',
-                    'user_id': self.user.id,
-                    'user_email': self.user.email,
-                }
-            )
+            await self.mark_typing(self.task_id)
+        elif message_type == 'get_watchers':
+            await self.send(text_data=json.dumps({
+                'type': 'watchers',
+                'users': await self.get_watchers(self.task_id),
+            }))
+    
+    async def send_presence(self, task_id, payload):
+        await self.send(text_data=json.dumps(payload))
     
     async def task_updated(self, event):
         """Send task update to WebSocket"""
@@ -157,36 +248,105 @@ class TaskConsumer(AsyncWebsocketConsumer):
             'type': 'status_changed',
             'data': event['data']
         }))
+
+
+class FeedStreamMixin:
+    """
+    Server-side filtering and batching of feed_update events
     
-    async def user_joined(self, event):
-        """Notify that a user joined"""
-        await self.send(text_data=json.dumps({
-            'type': 'user_joined',
-            'user_id': event['user_id'],
-            'user_email': event['user_email'],
-        }))
+    The consumer joins feed_org_{id} for each of the user's organizations
+    plus feed_user_{id}, over which membership changes arrive so groups are
+    swapped without a reconnect. Updates that pass the client's project and
+    activity type filters are buffered and sent as one feed_updates frame
+    per FEED_BATCH_WINDOW. Subclasses implement send_feed().
+    """
     
-    async def user_left(self, event):
-        """Notify that a user left"""
-        await self.send(text_data=json.dumps({
-            'type': 'user_left',
-            'user_id': event['user_id'],
-            'user_email': event['user_email'],
-        }))
+    FILTER_TYPES = {'projects': int, 'activity_types': str}
     
-    async def typing_indicator(self, event):
-        """Send typing indicator"""
-        await self.send(text_data=json.dumps({
-            'type': 'typing',
-            'user_id': event['user_id'],
-            'user_email': event['user_email'],
-        }))
+    def start_feed(self):
+        self.feed_groups = []
+        self.feed_filters = dict.fromkeys(self.FILTER_TYPES)
+        self.feed_buffer = []
+        self.feed_flush = None
+    
+    def set_feed_filters(self, data):
+        """Apply the filters in a client message; return an error message or None"""
+        filters = {}
+        for name, item_type in self.FILTER_TYPES.items():
+            values = data.get(name)
+            if values is not None and not (
+                isinstance(values, list) and all(isinstance(value, item_type) for value in values)
+            ):
+                return f'{name} must be a list of {item_type.__name__}'
+            # A missing or empty list means no filtering on that field
+            filters[name] = set(values) if values else None
+        self.feed_filters = filters
+        return None
+    
+    def describe_feed_filters(self):
+        return {
+            name: sorted(values) if values else None
+            for name, values in self.feed_filters.items()
+        }
+    
+    def feed_matches(self, item):
+        projects = self.feed_filters['projects']
+        activity_types = self.feed_filters['activity_types']
+        return (
+            (projects is None or item.get('project_id') in projects)
+            and (activity_types is None or item.get('activity_type') in activity_types)
+        )
+    
+    async def join_feed_groups(self):
+        """Join the feed groups of the user's current organizations; return their IDs"""
+        from organizations.scope import load_user_scope
+        
+        # Straight from the database: other processes may still cache the old scope
+        scope = await database_sync_to_async(load_user_scope)(self.user)
+        groups = [f'feed_user_{self.user.id}'] + [f'feed_org_{org_id}' for org_id in scope.org_ids]
+        
+        for group in set(groups) - set(self.feed_groups):
+            await self.channel_layer.group_add(group, self.channel_name)
+        for group in set(self.feed_groups) - set(groups):
+            await self.channel_layer.group_discard(group, self.channel_name)
+        self.feed_groups = groups
+        return scope.org_ids
+    
+    async def leave_feed_groups(self):
+        if getattr(self, 'feed_flush', None) is not None:
+            self.feed_flush.cancel()
+            self.feed_flush = None
+        for group in getattr(self, 'feed_groups', []):
+            await self.channel_layer.group_discard(group, self.channel_name)
+        self.feed_groups = []
+    
+    async def flush_feed(self):
+        await asyncio.sleep(FEED_BATCH_WINDOW)
+        items, self.feed_buffer, self.feed_flush = self.feed_buffer, [], None
+        await self.send_feed({'type': 'feed_updates', 'items': items})
+    
+    async def feed_update(self, event):
+        """Buffer a feed update that passes the filters"""
+        if not self.feed_matches(event['data']):
+            return
+        self.feed_buffer.append(event['data'])
+        if self.feed_flush is None:
+            self.feed_flush = asyncio.ensure_future(self.flush_feed())
+    
+    async def membership_changed(self, event):
+        """Follow the user into or out of organizations"""
+        org_ids = await self.join_feed_groups()
+        await self.send_feed({'type': 'organizations_changed', 'organizations': org_ids})
 
 
-class FeedConsumer(AsyncWebsocketConsumer):
+class FeedConsumer(FeedStreamMixin, AsyncWebsocketConsumer):
     """
     WebSocket consumer for live feed updates
     Users see real-time activity from their organization
+    
+    Clients narrow the stream with
+        {"type": "filter", "projects": [3, 4], "activity_types": ["TASK_CREATED"]}
+    and receive {"type": "feed_updates", "items": [...]} frames.
     """
     
     async def connect(self):
@@ -196,18 +356,9 @@ class FeedConsumer(AsyncWebsocketConsumer):
         if self.user.is_anonymous:
             await self.close()
         else:
-            # Get user's organizations
-            org_ids = await self.get_user_organizations()
-            
             # Join all organization feed rooms
-            self.room_groups = []
-            for org_id in org_ids:
-                room_name = f'feed_org_{org_id}'
-                self.room_groups.append(room_name)
-                await self.channel_layer.group_add(
-                    room_name,
-                    self.channel_name
-                )
+            self.start_feed()
+            org_ids = await self.join_feed_groups()
             
             await self.accept()
             
@@ -219,12 +370,7 @@ class FeedConsumer(AsyncWebsocketConsumer):
     
     async def disconnect(self, close_code):
         """Disconnect from feed"""
-        if hasattr(self, 'room_groups'):
-            for room_group in self.room_groups:
-                await self.channel_layer.group_discard(
-                    room_group,
-                    self.channel_name
-                )
+        await self.leave_feed_groups()
     
     async def receive(self, text_data):
         """Handle incoming messages"""
@@ -232,19 +378,202 @@ class FeedConsumer(AsyncWebsocketConsumer):
         
         if data.get('type') == 'ping':
             await self.send(text_data=json.dumps({'type': 'pong'}))
+        elif data.get('type') == 'filter':
+            error = self.set_feed_filters(data)
+            if error:
+                await self.send(text_data=json.dumps({'type': 'error', 'message': error}))
+            else:
+                await self.send(text_data=json.dumps({
+                    'type': 'filters_updated',
+                    'filters': self.describe_feed_filters(),
+                }))
     
-    async def feed_update(self, event):
-        """Send feed update to WebSocket"""
-        await self.send(text_data=json.dumps({
-            'type': 'feed_update',
-            'data': event['data']
-        }))
+    async def send_feed(self, payload):
+        await self.send(text_data=json.dumps(payload))
+
+
+class MultiplexConsumer(TaskPresenceMixin, FeedStreamMixin, AsyncWebsocketConsumer):
+    """
+    One authenticated socket for notifications, task updates and the feed
+    
+    Clients manage what they receive with
+        {"type": "subscribe", "channel": "task", "id": 12}
+        {"type": "subscribe", "channel": "feed", "projects": [3], "activity_types": [...]}
+        {"type": "unsubscribe", "channel": "feed"}
+        {"type": "typing", "channel": "task", "id": 12}
+        {"type": "get_watchers", "channel": "task", "id": 12}
+    where channel is 'notifications', 'task' (with an id) or 'feed'. The
+    user's notifications are subscribed on connect. Every event sent back
+    carries the channel it came from (and the task id for task events).
+    Feed filters are applied server-side and feed updates arrive batched
+    (see FeedStreamMixin); subscribing to the feed again replaces the filters.
+    """
+    
+    CHANNELS = ('notifications', 'task', 'feed')
+    MAX_TASK_SUBSCRIPTIONS = 50
+    
+    async def connect(self):
+        """Accept authenticated users and subscribe them to their notifications"""
+        self.user = self.scope['user']
+        
+        if self.user.is_anonymous:
+            await self.close()
+            return
+        
+        # (channel, id) -> channel layer groups joined for it
+        self.subscriptions = {}
+        await self.accept()
+        self.start_presence()
+        self.start_feed()
+        await self.send_event({
+            'type': 'connection_established',
+            'message': 'Connected',
+            'channels': list(self.CHANNELS),
+        })
+        
+        await self.subscribe('notifications', None)
+    
+    async def disconnect(self, close_code):
+        """Leave every subscribed group"""
+        await self.stop_presence()
+        await self.leave_feed_groups()
+        for channel, object_id in list(getattr(self, 'subscriptions', {})):
+            await self.unsubscribe(channel, object_id)
+    
+    async def receive(self, text_data):
+        """Handle subscribe, unsubscribe and ping messages"""
+        try:
+            data = json.loads(text_data)
+        except ValueError:
+            await self.send_error('Invalid JSON')
+            return
+        
+        message_type = data.get('type')
+        channel = data.get('channel')
+        object_id = data.get('id')
+        
+        if message_type == 'ping':
+            await self.send_event({'type': 'pong'})
+        elif message_type in ('typing', 'get_watchers'):
+            if ('task', object_id) not in self.subscriptions:
+                await self.send_error('Subscribe to the task first', object_id)
+            elif message_type == 'typing':
+                await self.mark_typing(object_id)
+            else:
+                await self.send_task_event({'task_id': object_id}, {
+                    'type': 'watchers',
+                    'users': await self.get_watchers(object_id),
+                })
+        elif message_type in ('subscribe', 'unsubscribe'):
+            if channel not in self.CHANNELS:
+                await self.send_error(f'Unknown channel: {channel}')
+            elif (channel == 'task') != isinstance(object_id, int):
+                await self.send_error('Only the task channel takes an integer id')
+            elif message_type == 'subscribe':
+                await self.subscribe(channel, object_id, data)
+            else:
+                await self.unsubscribe(channel, object_id)
+        else:
+            await self.send_error(f'Unknown message type: {message_type}')
+    
+    async def subscribe(self, channel, object_id, options=None):
+        key = (channel, object_id)
+        if channel == 'feed':
+            await self.subscribe_feed(options or {})
+            return
+        
+        if key not in self.subscriptions:
+            if channel == 'task' and self.task_subscription_count() >= self.MAX_TASK_SUBSCRIPTIONS:
+                await self.send_error('Too many task subscriptions')
+                return
+            
+            groups = await self.get_groups(channel, object_id)
+            if groups is None:
+                await self.send_error(f'Cannot subscribe to {channel}', object_id)
+                return
+            
+            for group in groups:
+                await self.channel_layer.group_add(group, self.channel_name)
+            self.subscriptions[key] = groups
+            
+            if channel == 'task':
+                await self.join_presence(object_id)
+        
+        await self.send_event({'type': 'subscribed', 'channel': channel, 'id': object_id})
+    
+    async def subscribe_feed(self, options):
+        error = self.set_feed_filters(options)
+        if error:
+            await self.send_error(error)
+            return
+        
+        if ('feed', None) not in self.subscriptions:
+            await self.join_feed_groups()
+            # Groups follow membership changes, see FeedStreamMixin
+            self.subscriptions[('feed', None)] = []
+        
+        await self.send_event({
+            'type': 'subscribed',
+            'channel': 'feed',
+            'id': None,
+            'filters': self.describe_feed_filters(),
+        })
+    
+    async def unsubscribe(self, channel, object_id):
+        groups = self.subscriptions.pop((channel, object_id), None)
+        if groups is None:
+            return
+        
+        if channel == 'feed':
+            await self.leave_feed_groups()
+        elif channel == 'task':
+            await self.leave_presence(object_id)
+        for group in groups:
+            await self.channel_layer.group_discard(group, self.channel_name)
+    
+    def task_subscription_count(self):
+        return sum(1 for channel, _ in self.subscriptions if channel == 'task')
     
     @database_sync_to_async
-    def get_user_organizations(self):
-        """Get list of organization IDs user belongs to"""
-        from organizations.models import Membership
-        return list(
-            Membership.objects.filter(user=self.user)
-            .values_list('organization_id', flat=True)
-        )
\ No newline at end of file
+    def get_groups(self, channel, object_id):
+        """Return the groups behind a channel, or None if the user may not see it"""
+        from organizations.scope import get_user_scope
+        from .models import Task
+        
+        if channel == 'notifications':
+            return [f'notifications_{self.user.id}']
+        
+        scope = get_user_scope(self.user)
+        tasks = Task.objects.filter(id=object_id)
+        if not scope.is_superuser:
+            tasks = tasks.filter(project__organization_id__in=scope.org_ids)
+        return [f'task_{object_id}'] if tasks.exists() else None
+    
+    async def send_event(self, payload):
+        await self.send(text_data=json.dumps(payload))
+    
+    async def send_error(self, message, object_id=None):
+        await self.send_event({'type': 'error', 'message': message, 'id': object_id})
+    
+    async def send_task_event(self, event, payload):
+        await self.send_event({'channel': 'task', 'id': event.get('task_id'), **payload})
+    
+    # Channel layer events
+    
+    async def notification_message(self, event):
+        await self.send_event({'channel': 'notifications', 'type': 'notification', **event['data']})
+    
+    async def task_updated(self, event):
+        await self.send_task_event(event, {'type': 'task_updated', 'data': event['data']})
+    
+    async def comment_added(self, event):
+        await self.send_task_event(event, {'type': 'comment_added', 'data': event['data']})
+    
+    async def status_changed(self, event):
+        await self.send_task_event(event, {'type': 'status_changed', 'data': event['data']})
+    
+    async def send_presence(self, task_id, payload):
+        await self.send_task_event({'task_id': task_id}, payload)
+    
+    async def send_feed(self, payload):
+        await self.send_event({'channel': 'feed', **payload})
@@ -0,0 +1,89 @@
+"""
+Compact storage for cached feed pages
+
+Feed pages are cached on the dedicated 'feed' alias, which stores JSON
+compressed with zlib (see CACHES in settings) instead of pickles. Before
+that, pack_page() shrinks the page itself: item keys are written once per
+page rather than once per item, and the actor, task, project and
+organization columns FeedSerializer repeats on every item are stored once
+per distinct value and referenced by position. Recently read pages are
+also kept in process memory (see core.cache).
+"""
+from core.cache import TwoTierCache
+
+FEED_CACHE_ALIAS = 'feed'
+
+# Columns that describe one related object, shared by many items of a page
+SHARED_COLUMNS = {
+    'actor': ('actor', 'actor_email', 'actor_name'),
+    'task': ('task', 'task_title'),
+    'project': ('project', 'project_name'),
+    'organization': ('organization', 'organization_name'),
+}
+
+
+def pack_items(items):
+    """Turn a list of serialized items into {'fields', 'own', 'shared', 'rows'}"""
+    fields = list(items[0]) if items else []
+    shared = {
+        name: columns for name, columns in SHARED_COLUMNS.items()
+        if all(column in fields for column in columns)
+    }
+    grouped = {column for columns in shared.values() for column in columns}
+    own = [field for field in fields if field not in grouped]
+
+    tables = {name: [] for name in shared}
+    positions = {name: {} for name in shared}
+    rows = []
+    for item in items:
+        row = [item[field] for field in own]
+        for name, columns in shared.items():
+            values = tuple(item[column] for column in columns)
+            position = positions[name].setdefault(values, len(tables[name]))
+            if position == len(tables[name]):
+                tables[name].append(values)
+            row.append(position)
+        rows.append(row)
+
+    return {
+        'fields': fields,
+        'own': own,
+        'shared': {name: {'columns': shared[name], 'rows': tables[name]} for name in shared},
+        'rows': rows,
+    }
+
+
+def unpack_items(packed):
+    """Inverse of pack_items()"""
+    own = packed['own']
+    shared = list(packed['shared'].values())
+    items = []
+    for row in packed['rows']:
+        values = dict(zip(own, row))
+        for table, position in zip(shared, row[len(own):]):
+            values.update(zip(table['columns'], table['rows'][position]))
+        items.append({field: values[field] for field in packed['fields']})
+    return items
+
+
+def pack_page(data):
+    """Pack a paginated response body (or a plain list of items)"""
+    if isinstance(data, list):
+        return {'items': pack_items(data)}
+    page = dict(data)
+    return {'page': page, 'items': pack_items(page.pop('results'))}
+
+
+def unpack_page(packed):
+    items = unpack_items(packed['items'])
+    if 'page' not in packed:
+        return items
+    return {**packed['page'], 'results': items}
+
+
+page_cache = TwoTierCache('feed_pages', alias=FEED_CACHE_ALIAS)
+
+
+def get_or_build_page(cache_key, build, timeout):
+    """Return the cached feed page, building it with build() at most once at a time"""
+    return unpack_page(page_cache.get_or_fill(cache_key, lambda: pack_page(build()), timeout))
@@ -1,75 +1,124 @@
-from .models import Feed
-from django.core.cache import cache
+import time
+from collections import defaultdict
+from core.cache import TwoTierCache
+from django.conf import settings
+from django.db import transaction
 
 
-def create_feed_item(actor, activity_type, title, description='', 
-                     task=None, project=None, comment=None, organization=None, metadata=None):
+def publish_feed_items(feed_items):
     """
-    Helper function to create feed items and broadcast to WebSocket
+    Run the side effects of freshly inserted feed items
+    
+    Fans out to timelines, bumps cache generations and broadcasts to
+    WebSocket, with one membership and one actor query per batch.
     """
-    if not organization:
-        if task:
-            organization = task.project.organization
-        elif project:
-            organization = project.organization
+    if not feed_items:
+        return
+    
+    from django.contrib.auth import get_user_model
+    from organizations.models import Membership
+    from .timeline import push_feed_item
+    from .websocket_utils import batched, broadcast_feed_update
     
-    if not organization:
-        raise ValueError("Organization is required for feed items")
+    member_ids = defaultdict(list)
+    memberships = Membership.objects.filter(
+        organization_id__in={item.organization_id for item in feed_items}
+    ).values_list('organization_id', 'user_id')
+    for organization_id, user_id in memberships:
+        member_ids[organization_id].append(user_id)
     
-    feed_item = Feed.objects.create(
-        actor=actor,
-        activity_type=activity_type,
-        title=title,
-        description=description,
-        task=task,
-        project=project,
-        comment=comment,
-        organization=organization,
-        metadata=metadata or {}
+    actor_emails = dict(
+        get_user_model().objects.filter(
+            id__in={item.actor_id for item in feed_items}
+        ).values_list('id', 'email')
     )
     
-    # Invalidate related caches
-    invalidate_feed_caches(actor, organization, project)
+    # Fan out to materialized timelines once the rows are visible to readers
+    def fan_out():
+        for item in feed_items:
+            push_feed_item(item, member_ids[item.organization_id])
+    transaction.on_commit(fan_out)
     
-    # Broadcast to WebSocket
-    from .websocket_utils import broadcast_feed_update
-    broadcast_feed_update(
-        organization.id,
-        {
-            'id': feed_item.id,
-            'actor': actor.email,
-            'activity_type': activity_type,
-            'title': title,
-            'description': description,
-            'task_id': task.id if task else None,
-            'project_id': project.id if project else None,
-            'created_at': feed_item.created_at.isoformat(),
-        }
-    )
+    # Invalidate related caches
+    invalidate_feed_caches(feed_items)
     
-    return feed_item
+    # Broadcast to WebSocket, one channel layer flush per batch
+    with batched():
+        for item in feed_items:
+            broadcast_feed_update(
+                item.organization_id,
+                {
+                    'id': item.id,
+                    'actor': actor_emails.get(item.actor_id),
+                    'activity_type': item.activity_type,
+                    'title': item.title,
+                    'description': item.description,
+                    'task_id': item.task_id,
+                    'project_id': item.project_id,
+                    'created_at': item.created_at.isoformat(),
+                }
+            )
 
 
-def invalidate_feed_caches(actor, organization, project=None):
+# Read on every feed request; bumps reach other processes over pub/sub
+generation_cache = TwoTierCache('feed_generations')
+# Counters expire so idle users and organizations do not keep one forever.
+# The TTL must outlive the pages cached under a counter (their timeout plus
+# CACHE_STALE_TTL); a counter recreated after expiry starts from the clock.
+FEED_GENERATION_TTL = getattr(settings, 'FEED_GENERATION_TTL', 60 * 60 * 24)
+
+
+def generation_key(scope, scope_id):
+    """Cache key of the generation counter for a 'site', 'org', 'project' or 'user'"""
+    return f'feed_gen_{scope}_{scope_id}'
+
+
+def initial_generation():
     """
-    Invalidate all related feed caches when new activity is created
+    Start counters from the clock so a counter that was evicted never
+    comes back at a value an older cache entry was stored under
+    """
+    return int(time.time() * 1000)
+
+
+def get_feed_version(*scopes):
     """
-    # Invalidate actor's feed cache
-    cache.delete(f'feed_queryset_user_{actor.id}')
-    cache.delete(f'my_feed_user_{actor.id}')
+    Return a version string for the given (scope, id) pairs
     
-    # Invalidate organization members' caches
-    from organizations.models import Membership
-    member_ids = Membership.objects.filter(
-        organization=organization
-    ).values_list('user_id', flat=True)
+    Feed cache keys embed this string, so bumping any of the counters
+    retires every page cached under the old version at once.
+    """
+    keys = [generation_key(scope, scope_id) for scope, scope_id in scopes]
+    generations = generation_cache.get_many(keys)
+    
+    for key in keys:
+        if key not in generations:
+            value = initial_generation()
+            generations[key] = value if generation_cache.add(key, value, FEED_GENERATION_TTL) else generation_cache.get(key)
     
-    for user_id in member_ids:
-        cache.delete(f'feed_queryset_user_{user_id}')
-        cache.delete(f'feed_list_user_{user_id}_page_1')
-        cache.delete(f'org_feed_{organization.id}_user_{user_id}')
+    return '.'.join(str(generations[key]) for key in keys)
+
+
+def bump_feed_generation(scope, scope_id):
+    """Retire all cached feed pages that depend on this scope"""
+    key = generation_key(scope, scope_id)
+    try:
+        generation_cache.incr(key)
+    except ValueError:
+        generation_cache.add(key, initial_generation(), FEED_GENERATION_TTL)
+
+
+def invalidate_feed_caches(feed_items):
+    """
+    Invalidate all related feed caches when new activity is created
+    Bumps each affected generation counter once instead of deleting per-member keys
+    """
+    scopes = {('site', 0)}
+    for item in feed_items:
+        scopes.add(('org', item.organization_id))
+        scopes.add(('user', item.actor_id))
+        if item.project_id:
+            scopes.add(('project', item.project_id))
     
-    # Invalidate project feed cache if project is provided
-    if project:
-        for user_id in member_ids:
-            cache.delete(f'project_feed_{project.id}_user_{user_id}')
\ No newline at end of file
+    for scope, scope_id in scopes:
+        bump_feed_generation(scope, scope_id)
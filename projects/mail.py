@@ -0,0 +1,93 @@
+"""
+Batched email delivery
+
+Notification tasks build plain message dicts and hand them to send_batch,
+which sends them over one backend connection, MAIL_CHUNK_SIZE at a time.
+Messages that fail are re-queued per chunk through the send_mail_chunk
+task, so one bad address never makes a task resend the whole batch.
+"""
+import smtplib
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+
+MAIL_CHUNK_SIZE = getattr(settings, 'MAIL_CHUNK_SIZE', 100)
+
+# Errors that will happen again on retry; these messages are dropped
+PERMANENT_ERRORS = (smtplib.SMTPRecipientsRefused,)
+
+
+def message(subject, body, recipient):
+    """Build a JSON-serializable message so failed ones can go back through Celery"""
+    return {'subject': subject, 'body': body, 'to': [recipient]}
+
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def to_email(item, connection):
+    return EmailMessage(
+        subject=item['subject'],
+        body=item['body'],
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=item['to'],
+        connection=connection,
+    )
+
+
+def deliver(messages, chunk_size=MAIL_CHUNK_SIZE, backend=None, **backend_options):
+    """
+    Send messages over one open connection
+
+    Returns (sent, failed_chunks), where failed_chunks lists, per chunk, the
+    messages that hit a transient error. A dropped connection is reopened
+    and the rest of the batch carries on.
+    """
+    connection = get_connection(backend, fail_silently=False, **backend_options)
+    sent = 0
+    failed_chunks = []
+
+    try:
+        connection.open()
+    except Exception:
+        return 0, list(chunked(messages, chunk_size))
+
+    position = 0
+    failed = []
+    try:
+        for chunk in chunked(messages, chunk_size):
+            failed = []
+            for item in chunk:
+                position += 1
+                try:
+                    sent += connection.send_messages([to_email(item, connection)]) or 0
+                except PERMANENT_ERRORS as exc:
+                    print(f"❌ Dropping email to {', '.join(item['to'])}: {exc}")
+                except Exception:
+                    failed.append(item)
+                    connection.close()
+                    connection.open()
+            if failed:
+                failed_chunks.append(failed)
+    except Exception:
+        # The connection could not be reopened; retry everything not yet sent
+        failed_chunks.extend(chunked(failed + messages[position:], chunk_size))
+    finally:
+        connection.close()
+
+    return sent, failed_chunks
+
+
+def send_batch(messages, chunk_size=MAIL_CHUNK_SIZE):
+    """
+    Send messages and queue each chunk's failures for retry
+
+    Returns (sent, queued_for_retry)
+    """
+    from .tasks import send_mail_chunk
+
+    sent, failed_chunks = deliver(messages, chunk_size)
+    for failed in failed_chunks:
+        send_mail_chunk.delay(failed)
+    return sent, sum(len(failed) for failed in failed_chunks)
@@ -0,0 +1,67 @@
+import time
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from projects import feed_cache
+from projects.models import Feed
+from projects.serializers import FeedSerializer
+
+
+class Command(BaseCommand):
+    help = 'Compare the size and encode/decode time of cached feed pages on the default and feed aliases'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--page-size',
+            type=int,
+            default=20,
+            help='Feed items per page',
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=1000,
+            help='Encode/decode rounds to time',
+        )
+
+    def measure(self, encode, decode, iterations):
+        """Return (bytes, encode ms, decode ms) per page"""
+        start = time.perf_counter()
+        for _ in range(iterations):
+            raw = encode()
+        encoded = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            decode(raw)
+        decoded = time.perf_counter() - start
+        return len(raw), encoded * 1000 / iterations, decoded * 1000 / iterations
+
+    def handle(self, *args, **options):
+        items = FeedSerializer.setup_eager_loading(Feed.objects.order_by('-created_at'))[:options['page_size']]
+        if not items:
+            raise CommandError('No feed items to benchmark; create some activity first')
+
+        # The shape FeedViewSet caches: one page of the paginated response
+        page = {'count': len(items), 'next': None, 'previous': None, 'results': FeedSerializer(items, many=True).data}
+        iterations = options['iterations']
+
+        # Through the same django-redis clients the views use, without a round trip
+        default_client = caches['default'].client
+        feed_client = caches[feed_cache.FEED_CACHE_ALIAS].client
+        before = self.measure(
+            lambda: default_client.encode(page),
+            default_client.decode,
+            iterations,
+        )
+        after = self.measure(
+            lambda: feed_client.encode(feed_cache.pack_page(page)),
+            lambda raw: feed_cache.unpack_page(feed_client.decode(raw)),
+            iterations,
+        )
+
+        self.stdout.write(f'{len(items)} feed items per page, {iterations} iterations')
+        for label, (size, encode_ms, decode_ms) in (('default (pickle)', before), ('feed (packed json+zlib)', after)):
+            self.stdout.write(
+                f'  {label:<24} {size:>7} bytes  encode {encode_ms:.3f}ms  decode {decode_ms:.3f}ms'
+            )
+        self.stdout.write(self.style.SUCCESS(f'Size: {after[0] / before[0]:.0%} of the pickled page'))
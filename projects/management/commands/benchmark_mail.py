@@ -0,0 +1,66 @@
+import tempfile
+import time
+from django.core.mail import send_mail, get_connection
+from django.core.management.base import BaseCommand
+from projects import mail
+
+BACKENDS = {
+    'locmem': 'django.core.mail.backends.locmem.EmailBackend',
+    'file': 'django.core.mail.backends.filebased.EmailBackend',
+}
+
+
+class Command(BaseCommand):
+    help = 'Compare per-message send_mail with batched delivery on a local mail backend'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--messages',
+            type=int,
+            default=1000,
+            help='Number of messages to send in each run',
+        )
+        parser.add_argument(
+            '--backend',
+            choices=sorted(BACKENDS),
+            default='locmem',
+            help='Mail backend to send through',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=mail.MAIL_CHUNK_SIZE,
+            help='Messages per chunk for batched delivery',
+        )
+
+    def handle(self, *args, **options):
+        backend = BACKENDS[options['backend']]
+        messages = [
+            mail.message(f'Benchmark {i}', 'Benchmark message body', f'user{i}@example.com')
+            for i in range(options['messages'])
+        ]
+
+        with tempfile.TemporaryDirectory() as file_path:
+            backend_options = {'file_path': file_path} if options['backend'] == 'file' else {}
+
+            # One connection per message, as the notification tasks used to do
+            start = time.perf_counter()
+            for item in messages:
+                send_mail(
+                    subject=item['subject'],
+                    message=item['body'],
+                    from_email=None,
+                    recipient_list=item['to'],
+                    connection=get_connection(backend, **backend_options),
+                )
+            per_message = time.perf_counter() - start
+
+            start = time.perf_counter()
+            sent, failed_chunks = mail.deliver(messages, options['chunk_size'], backend, **backend_options)
+            batched = time.perf_counter() - start
+
+        count = len(messages)
+        self.stdout.write(f'{options["backend"]} backend, {count} messages')
+        self.stdout.write(f'  send_mail per message: {per_message:.3f}s ({count / per_message:.0f} msg/s)')
+        self.stdout.write(f'  batched delivery:      {batched:.3f}s ({sent / batched:.0f} msg/s)')
+        self.stdout.write(self.style.SUCCESS(f'Speedup: {per_message / batched:.1f}x'))
@@ -1,9 +1,33 @@
+import time
+from django.conf import settings
+from django.core.cache import caches
 from django.core.management.base import BaseCommand
-from django.core.cache import cache
+from django_redis import get_redis_connection
+
+
+def scan_batches(con, match, batch_size):
+    """Yield lists of up to batch_size keys matching `match`, walked with SCAN"""
+    batch = []
+    for key in con.scan_iter(match=match, count=batch_size):
+        batch.append(key)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def unlink(con, keys):
+    """Unlink keys in one pipelined round trip; return how many existed"""
+    # One UNLINK per key keeps every command single-slot on Redis Cluster
+    pipe = con.pipeline(transaction=False)
+    for key in keys:
+        pipe.unlink(key)
+    return sum(pipe.execute())
 
 
 class Command(BaseCommand):
-    help = 'Clear all Redis cache'
+    help = 'Clear Redis cache keys without blocking the server'
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -11,23 +35,58 @@ class Command(BaseCommand):
             type=str,
             help='Clear cache keys matching pattern',
         )
+        parser.add_argument(
+            '--alias',
+            choices=list(settings.CACHES),
+            action='append',
+            help='Cache alias to clear (default: every alias in CACHES)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Count the matching keys without deleting them',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Keys per SCAN call and per UNLINK pipeline',
+        )
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=0,
+            help='Seconds to sleep between batches, to go easy on a live server',
+        )
 
     def handle(self, *args, **options):
         pattern = options.get('pattern')
-        
-        if pattern:
-            # Clear specific pattern
-            from django_redis import get_redis_connection
-            con = get_redis_connection("default")
-            keys = con.keys(f"*{pattern}*")
-            if keys:
-                con.delete(*keys)
-                self.stdout.write(
-                    self.style.SUCCESS(f'Cleared {len(keys)} cache keys matching "{pattern}"')
-                )
+        match = f'*{pattern}*' if pattern else '*'
+        verb = 'Found' if options['dry_run'] else 'Cleared'
+
+        for alias in options['alias'] or settings.CACHES:
+            if 'django_redis' not in settings.CACHES[alias]['BACKEND']:
+                if pattern or options['dry_run']:
+                    self.stdout.write(self.style.WARNING(f'[{alias}] not a Redis cache, skipped'))
+                else:
+                    caches[alias].clear()
+                    self.stdout.write(self.style.SUCCESS(f'[{alias}] Successfully cleared all cache'))
+                continue
+
+            con = get_redis_connection(alias)
+            start = time.monotonic()
+            count = 0
+            for batch in scan_batches(con, match, options['batch_size']):
+                count += len(batch) if options['dry_run'] else unlink(con, batch)
+                if options['pause']:
+                    time.sleep(options['pause'])
+            elapsed = time.monotonic() - start
+
+            rate = round(count / elapsed) if elapsed else count
+            description = f'cache keys matching "{pattern}"' if pattern else 'cache keys'
+            if count:
+                self.stdout.write(self.style.SUCCESS(
+                    f'[{alias}] {verb} {count} {description} in {elapsed:.2f}s ({rate} keys/sec)'
+                ))
             else:
-                self.stdout.write(self.style.WARNING(f'No cache keys found matching "{pattern}"'))
-        else:
-            # Clear all cache
-            cache.clear()
-            self.stdout.write(self.style.SUCCESS('Successfully cleared all cache'))
\ No newline at end of file
+                self.stdout.write(self.style.WARNING(f'[{alias}] No {description} found'))
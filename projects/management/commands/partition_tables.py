@@ -0,0 +1,75 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from projects import partitions
+
+
+class Command(BaseCommand):
+    help = 'Convert feeds/activity_logs to monthly partitions and manage their partitions'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--table',
+            choices=partitions.PARTITIONED_TABLES,
+            action='append',
+            help='Table to work on (default: all partitioned tables)',
+        )
+        parser.add_argument(
+            '--convert',
+            action='store_true',
+            help='Swap the table for a partitioned one, then backfill its history',
+        )
+        parser.add_argument(
+            '--backfill',
+            action='store_true',
+            help='Resume copying rows from <table>_legacy after an interrupted conversion',
+        )
+        parser.add_argument(
+            '--drop-legacy',
+            action='store_true',
+            help='Drop <table>_legacy once the backfill is complete',
+        )
+        parser.add_argument(
+            '--months-ahead',
+            type=int,
+            default=partitions.PARTITION_MONTHS_AHEAD,
+            help='Future monthly partitions to create',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=partitions.BACKFILL_BATCH_SIZE,
+            help='Rows copied per backfill transaction',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Table partitioning requires PostgreSQL')
+
+        for table in options['table'] or partitions.PARTITIONED_TABLES:
+            if options['convert']:
+                if partitions.is_partitioned(table):
+                    self.stdout.write(f'{table} is already partitioned')
+                else:
+                    partitions.convert_table(table, options['months_ahead'])
+                    self.stdout.write(self.style.SUCCESS(f'Converted {table} to monthly partitions'))
+
+            if not partitions.is_partitioned(table):
+                self.stdout.write(self.style.WARNING(f'{table} is not partitioned; run with --convert'))
+                continue
+
+            if options['convert'] or options['backfill']:
+                copied = 0
+                for rows in partitions.backfill(table, options['batch_size']):
+                    copied += rows
+                    self.stdout.write(f'  {table}: copied {copied} rows')
+                self.stdout.write(self.style.SUCCESS(f'Backfilled {copied} rows into {table}'))
+
+            if options['drop_legacy']:
+                partitions.drop_legacy(table)
+                self.stdout.write(f'Dropped {partitions.legacy_name(table)}')
+
+            for name in partitions.ensure_partitions(table, options['months_ahead']):
+                self.stdout.write(f'Created partition {name}')
+
+            names = [name for name, _ in partitions.list_partitions(table)]
+            self.stdout.write(f'{table}: {len(names)} partitions ({", ".join(names)})')
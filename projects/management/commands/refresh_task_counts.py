@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from projects.models import Project
+
+
+class Command(BaseCommand):
+    help = 'Recompute denormalized task counters on every project'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Projects updated per query batch',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        fields = Project.STATUS_COUNTER_FIELDS
+        
+        projects = Project.annotate_task_counts(Project.objects.order_by('id'))
+        
+        batch = []
+        updated = 0
+        for project in projects.iterator(chunk_size=batch_size):
+            project.task_count = project.num_tasks
+            for status, field in fields.items():
+                setattr(project, field, getattr(project, f'num_{status.lower()}_tasks'))
+            batch.append(project)
+            
+            if len(batch) >= batch_size:
+                updated += Project.objects.bulk_update(batch, ['task_count', *fields.values()])
+                batch = []
+        
+        if batch:
+            updated += Project.objects.bulk_update(batch, ['task_count', *fields.values()])
+        
+        self.stdout.write(self.style.SUCCESS(f'Refreshed task counters on {updated} projects'))
@@ -0,0 +1,15 @@
+from .websocket_utils import batched
+
+
+class BroadcastBatchMiddleware:
+    """
+    Collect the WebSocket broadcasts a request makes and send them in one
+    channel layer flush after the view returns
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with batched():
+            return self.get_response(request)
@@ -0,0 +1,80 @@
+# Generated by Django 5.2.9 on 2026-10-17 06:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organizations', '0001_initial'),
+        ('projects', '0008_task_due_reminders'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='activitylog',
+            name='activity_lo_created_d8c226_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='activitylog',
+            name='activity_lo_project_d86fcc_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='activitylog',
+            name='activity_lo_task_id_984074_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='feed',
+            name='feeds_created_de02b2_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='feed',
+            name='feeds_organiz_d2a4e1_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='feed',
+            name='feeds_actor_i_29ae7a_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='task',
+            name='tasks_project_cc077f_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='task',
+            name='tasks_project_0edc9c_idx',
+        ),
+        migrations.AddIndex(
+            model_name='activitylog',
+            index=models.Index(fields=['-created_at', '-id'], name='activity_lo_created_fc6e69_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='activitylog',
+            index=models.Index(fields=['project', '-created_at', '-id'], name='activity_lo_project_90618c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='activitylog',
+            index=models.Index(fields=['task', '-created_at', '-id'], name='activity_lo_task_id_e98cf8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feed',
+            index=models.Index(fields=['-created_at', '-id'], name='feeds_created_a67877_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feed',
+            index=models.Index(fields=['organization', '-created_at', '-id'], name='feeds_organiz_42c359_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feed',
+            index=models.Index(fields=['actor', '-created_at', '-id'], name='feeds_actor_i_906a1c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['project', '-created_at', '-id'], name='tasks_project_9f348e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['project', 'status', '-created_at', '-id'], name='tasks_project_eae765_idx'),
+        ),
+    ]
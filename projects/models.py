@@ -1,5 +1,7 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, F, Q
 from django.conf import settings
+from django.utils import timezone
 from organizations.models import Organization
 
 User = settings.AUTH_USER_MODEL
@@ -31,15 +33,71 @@ class Project(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='ACTIVE')
     start_date = models.DateField(null=True, blank=True)
     end_date = models.DateField(null=True, blank=True)
+    
+    # Denormalized task counters, maintained when PROJECT_TASK_COUNTERS is on
+    # (backfill with `manage.py refresh_task_counts` before enabling)
+    task_count = models.PositiveIntegerField(default=0)
+    todo_task_count = models.PositiveIntegerField(default=0)
+    in_progress_task_count = models.PositiveIntegerField(default=0)
+    done_task_count = models.PositiveIntegerField(default=0)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Task status -> counter field
+    STATUS_COUNTER_FIELDS = {
+        'TODO': 'todo_task_count',
+        'IN_PROGRESS': 'in_progress_task_count',
+        'DONE': 'done_task_count',
+    }
+    
     class Meta:
         db_table = 'projects'
         ordering = ['-created_at']
         
     def __str__(self):
         return f"{self.name} - {self.organization.name}"
+    
+    @classmethod
+    def adjust_task_counts(cls, project_id, deltas):
+        """Apply {counter_field: delta} to a project's counters in one UPDATE"""
+        updates = {field: F(field) + delta for field, delta in deltas.items() if delta}
+        if updates:
+            cls.objects.filter(pk=project_id).update(**updates)
+    
+    @classmethod
+    def annotate_task_counts(cls, queryset):
+        """Annotate total and per-status task counts in the base query"""
+        return queryset.annotate(
+            num_tasks=Count('tasks'),
+            **{
+                f'num_{status.lower()}_tasks': Count('tasks', filter=Q(tasks__status=status))
+                for status in cls.STATUS_COUNTER_FIELDS
+            }
+        )
+    
+    def get_task_counts(self):
+        """
+        Return {'total': n, 'TODO': n, 'IN_PROGRESS': n, 'DONE': n}
+        Reads annotations or denormalized counters when present, else queries
+        """
+        if hasattr(self, 'num_tasks'):
+            counts = {
+                status: getattr(self, f'num_{status.lower()}_tasks')
+                for status in self.STATUS_COUNTER_FIELDS
+            }
+            return {'total': self.num_tasks, **counts}
+        
+        if getattr(settings, 'PROJECT_TASK_COUNTERS', False):
+            counts = {
+                status: getattr(self, field)
+                for status, field in self.STATUS_COUNTER_FIELDS.items()
+            }
+            return {'total': self.task_count, **counts}
+        
+        counts = dict.fromkeys(self.STATUS_COUNTER_FIELDS, 0)
+        counts.update(self.tasks.order_by().values_list('status').annotate(Count('id')))
+        return {'total': sum(counts.values()), **counts}
 
 
 class Task(models.Model):
@@ -81,12 +139,22 @@ class Task(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='TODO')
     priority = models.CharField(max_length=20, choices=PRIORITY_CHOICES, default='MEDIUM')
     due_date = models.DateField(null=True, blank=True)
+    # Due date the assignee was last reminded about, so reminders go out once
+    reminder_sent_for = models.DateField(null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         db_table = 'tasks'
         ordering = ['-created_at']
+        indexes = [
+            # id breaks created_at ties, so keyset cursors stay index range scans
+            models.Index(fields=['project', '-created_at', '-id']),
+            # Board columns: one range scan per (project, status)
+            models.Index(fields=['project', 'status', '-created_at', '-id']),
+            # Due date reminders
+            models.Index(fields=['due_date', 'status']),
+        ]
         
     def __str__(self):
         return f"{self.title} ({self.status})"
@@ -99,66 +167,191 @@ class Task(models.Model):
             'DONE': ['IN_PROGRESS'],
         }
         return new_status in valid_transitions.get(self.status, [])
-    def save(self, *args, **kwargs):
-        """Override save to create activity logs and feed items"""
-        is_update = self.pk is not None
-        old_status = None
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remember the values the task was loaded with"""
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = {
+            name: value for name, value in zip(field_names, values)
+            if value is not models.DEFERRED
+        }
+        return instance
+    
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        if fields is None:
+            self._loaded_values = self._current_values()
+            return
         
-        if is_update:
-            try:
-                old_task = Task.objects.get(pk=self.pk)
-                old_status = old_task.status
-            except Task.DoesNotExist:
-                pass
+        # Only the refreshed fields are clean again; edits to others stay pending
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is not None:
+            current = self._current_values()
+            for name in fields:
+                attname = self._meta.get_field(name).attname
+                if attname in current:
+                    loaded[attname] = current[attname]
+    
+    def _current_values(self):
+        deferred = self.get_deferred_fields()
+        return {
+            field.attname: getattr(self, field.attname)
+            for field in self._meta.concrete_fields
+            if field.attname not in deferred
+        }
+    
+    def get_changed_fields(self):
+        """
+        Return {attname: old_value} for fields changed since the task was loaded
+        None when the original state is unknown (the task was not loaded from the DB)
+        """
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return None
         
-        super().save(*args, **kwargs)
+        return {
+            name: loaded[name]
+            for name, value in self._current_values().items()
+            if name in loaded and loaded[name] != value
+        }
+    
+    def _stored_changes(self):
+        """
+        Like get_changed_fields() for project and status, read from the
+        stored row; None when there is no row with this pk
+        """
+        stored = Task.objects.filter(pk=self.pk).values('project_id', 'status').first()
+        if stored is None:
+            return None
+        return {name: value for name, value in stored.items() if getattr(self, name) != value}
+    
+    def _adjust_project_counters(self, changes):
+        """Keep Project task counters in step with a create, move or status change"""
+        fields = Project.STATUS_COUNTER_FIELDS
+        if changes is None:
+            Project.adjust_task_counts(self.project_id, {'task_count': 1, fields[self.status]: 1})
+            return
+        
+        old_project_id = changes.get('project_id', self.project_id)
+        old_status = changes.get('status', self.status)
+        if old_project_id != self.project_id:
+            Project.adjust_task_counts(old_project_id, {'task_count': -1, fields[old_status]: -1})
+            Project.adjust_task_counts(self.project_id, {'task_count': 1, fields[self.status]: 1})
+        elif old_status != self.status:
+            Project.adjust_task_counts(self.project_id, {fields[old_status]: -1, fields[self.status]: 1})
+    
+    def save(self, *args, actor=None, **kwargs):
+        """
+        Override save to record activity and feed items in the outbox
         
-        # Import here to avoid circular imports
-        from .feed_utils import create_feed_item
+        A task loaded from the DB writes only the columns changed since it
+        was loaded, plus updated_at (so a save with no changes still touches
+        updated_at and sends the save signals). Otherwise all columns are
+        written, and for an existing row the stored project and status are
+        read first.
         
-        if not is_update:
-            # New task created
-            ActivityLog.objects.create(
-                actor=self.reporter,
-                action='TASK_CREATED',
-                description=f'Created task "{self.title}"',
-                task=self,
-                project=self.project,
-                metadata={
-                    'task_id': self.id,
-                    'task_title': self.title,
-                    'priority': self.priority,
-                }
-            )
+        Args:
+            actor: User making the change, recorded on the activity log
+                   (defaults to the reporter for new tasks)
+        """
+        changes = self.get_changed_fields() if self.pk is not None else None
+        
+        # Write only the changed columns when we know what was loaded
+        if changes is not None and not args and 'update_fields' not in kwargs:
+            kwargs['update_fields'] = [*changes, 'updated_at']
+        
+        with transaction.atomic():
+            if self.pk is not None and changes is None:
+                # Not loaded from the DB (e.g. built as Task(pk=...)): read the
+                # stored project and status so an update is not taken for a create
+                changes = self._stored_changes()
+            is_update = changes is not None
+            
+            super().save(*args, **kwargs)
+            self._loaded_values = self._current_values()
+            old_status = (changes or {}).get('status')
             
-            # Create feed item
-            create_feed_item(
-                actor=self.reporter,
-                activity_type='TASK_CREATED',
-                title=f'created task "{self.title}"',
-                description=f'Created a new task in project {self.project.name}',
-                task=self,
-                project=self.project,
-                organization=self.project.organization,
-                metadata={
-                    'priority': self.priority,
-                    'status': self.status,
-                }
-            )
+            if getattr(settings, 'PROJECT_TASK_COUNTERS', False):
+                self._adjust_project_counters(changes)
             
-        elif old_status and old_status != self.status:
-            # Status changed
-            ActivityLog.objects.create(
-                actor=None,
-                action='STATUS_CHANGED',
-                description=f'Changed status from {old_status} to {self.status}',
-                task=self,
-                project=self.project,
-                metadata={
-                    'old_status': old_status,
-                    'new_status': self.status,
-                }
-            )   
+            # Import here to avoid circular imports
+            from .outbox import record_event, task_broadcast, user_notification
+            
+            if not is_update:
+                # New task created
+                actor_id = actor.id if actor else self.reporter_id
+                record_event(
+                    'TASK_CREATED',
+                    activity={
+                        'actor_id': actor_id,
+                        'action': 'TASK_CREATED',
+                        'description': f'Created task "{self.title}"',
+                        'task_id': self.id,
+                        'project_id': self.project_id,
+                        'metadata': {
+                            'task_id': self.id,
+                            'task_title': self.title,
+                            'priority': self.priority,
+                        },
+                    },
+                    # Feed item
+                    feed={
+                        'actor_id': actor_id,
+                        'activity_type': 'TASK_CREATED',
+                        'title': f'created task "{self.title}"',
+                        'description': f'Created a new task in project {self.project.name}',
+                        'task_id': self.id,
+                        'project_id': self.project_id,
+                        'organization_id': self.project.organization_id,
+                        'metadata': {
+                            'priority': self.priority,
+                            'status': self.status,
+                        },
+                    } if actor_id else None,
+                )
+                
+            elif old_status:
+                # Status changed
+                changed_by = actor.email if actor else None
+                
+                # Broadcast status change via WebSocket
+                broadcasts = [
+                    task_broadcast(self.id, 'status_changed', {
+                        'task_id': self.id,
+                        'old_status': old_status,
+                        'new_status': self.status,
+                        'changed_by': changed_by,
+                    })
+                ]
+                
+                # Notify assignee if different from actor
+                if self.assignee_id and (actor is None or self.assignee_id != actor.id):
+                    broadcasts.append(user_notification(self.assignee_id, 'task_status_changed', {
+                        'task_id': self.id,
+                        'task_title': self.title,
+                        'old_status': old_status,
+                        'new_status': self.status,
+                        'changed_by': changed_by,
+                    }))
+                
+                record_event(
+                    'STATUS_CHANGED',
+                    activity={
+                        'actor_id': actor.id if actor else None,
+                        'action': 'STATUS_CHANGED',
+                        'description': f'Changed status from {old_status} to {self.status}',
+                        'task_id': self.id,
+                        'project_id': self.project_id,
+                        'metadata': {
+                            'old_status': old_status,
+                            'new_status': self.status,
+                        },
+                    },
+                    broadcasts=broadcasts,
+                )
+
+
 class Comment(models.Model):
     """Comment model - discussions on tasks"""
     
@@ -203,7 +396,8 @@ class Comment(models.Model):
         # Extract and link mentioned users
         mentioned_emails = self.extract_mentions()
         if mentioned_emails:
-            mentioned_users = User.objects.filter(email__in=mentioned_emails)
+            from django.contrib.auth import get_user_model
+            mentioned_users = get_user_model().objects.filter(email__in=mentioned_emails)
             self.mentioned_users.set(mentioned_users)
 
 
@@ -252,11 +446,17 @@ class ActivityLog(models.Model):
     )
     
     metadata = models.JSONField(default=dict, blank=True)  # Store additional data
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(default=timezone.now, editable=False)  # The outbox drain passes the event's time
     
     class Meta:
         db_table = 'activity_logs'
         ordering = ['-created_at']
+        indexes = [
+            # id breaks created_at ties, so keyset cursors stay index range scans
+            models.Index(fields=['-created_at', '-id']),
+            models.Index(fields=['project', '-created_at', '-id']),
+            models.Index(fields=['task', '-created_at', '-id']),
+        ]
     
     def __str__(self):
         return f"{self.actor.email if self.actor else 'System'} - {self.action} at {self.created_at}"
@@ -320,16 +520,39 @@ class Feed(models.Model):
     description = models.TextField(blank=True)
     metadata = models.JSONField(default=dict, blank=True)
     
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(default=timezone.now, editable=False)  # The outbox drain passes the event's time
     
     class Meta:
         db_table = 'feeds'
         ordering = ['-created_at']
         indexes = [
-            models.Index(fields=['-created_at']),
-            models.Index(fields=['organization', '-created_at']),
-            models.Index(fields=['actor', '-created_at']),
+            # id breaks created_at ties, so keyset cursors stay index range scans
+            models.Index(fields=['-created_at', '-id']),
+            models.Index(fields=['organization', '-created_at', '-id']),
+            models.Index(fields=['actor', '-created_at', '-id']),
         ]
     
     def __str__(self):
-        return f"{self.actor.email} - {self.activity_type} at {self.created_at}"
\ No newline at end of file
+        return f"{self.actor.email} - {self.activity_type} at {self.created_at}"
+
+class OutboxEvent(models.Model):
+    """Outbox - side effects recorded in the same transaction as a domain change"""
+    
+    EVENT_TYPE_CHOICES = [
+        ('TASK_CREATED', 'Task Created'),
+        ('STATUS_CHANGED', 'Status Changed'),
+        ('COMMENT_ADDED', 'Comment Added'),
+    ]
+    
+    event_type = models.CharField(max_length=50, choices=EVENT_TYPE_CHOICES)
+    
+    # ActivityLog/Feed field values and broadcasts, see projects.outbox
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'outbox_events'
+        ordering = ['id']
+    
+    def __str__(self):
+        return f"{self.event_type} #{self.id}"
@@ -0,0 +1,151 @@
+"""
+Transactional outbox for activity, feed and realtime side effects
+
+Domain writes (Task.save, comment creation, status updates) record one
+OutboxEvent in their own transaction instead of creating ActivityLog and
+Feed rows, invalidating caches and broadcasting inline. The drain_outbox
+Celery task turns batches of events into bulk inserts and channel
+broadcasts, so request latency only includes one extra INSERT and the
+side effects survive a crash between commit and delivery.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from organizations.models import Organization
+from .models import OutboxEvent, ActivityLog, Feed, Task, Project, Comment
+
+OUTBOX_BATCH_SIZE = getattr(settings, 'OUTBOX_BATCH_SIZE', 500)
+
+# Foreign keys an ActivityLog/Feed payload may carry, and the model they point at
+REFERENCES = {
+    'task_id': Task,
+    'project_id': Project,
+    'comment_id': Comment,
+    'organization_id': Organization,
+}
+
+
+def record_event(event_type, activity=None, feed=None, broadcasts=None):
+    """
+    Record side effects to run once the current transaction commits
+
+    Args:
+        event_type: One of OutboxEvent.EVENT_TYPE_CHOICES
+        activity: ActivityLog field values (use *_id keys for relations)
+        feed: Feed field values (use *_id keys for relations)
+        broadcasts: List of task_broadcast()/user_notification() entries
+    """
+    return OutboxEvent.objects.create(
+        event_type=event_type,
+        payload={
+            'activity': activity,
+            'feed': feed,
+            'broadcasts': broadcasts or [],
+        }
+    )
+
+
+def task_broadcast(task_id, update_type, data):
+    """Outbox entry for websocket_utils.broadcast_task_update"""
+    return {'kind': 'task', 'args': [task_id, update_type, data]}
+
+
+def user_notification(user_id, notification_type, data):
+    """Outbox entry for websocket_utils.send_notification_to_user"""
+    return {'kind': 'notification', 'args': [user_id, notification_type, data]}
+
+
+def existing_ids(rows):
+    """Return {attname: set of IDs that still exist} for the rows' references"""
+    wanted = {}
+    for row in rows:
+        for attname in [*REFERENCES, 'actor_id']:
+            if row.get(attname) is not None:
+                wanted.setdefault(attname, set()).add(row[attname])
+
+    models = {**REFERENCES, 'actor_id': get_user_model()}
+    return {
+        attname: set(models[attname].objects.filter(id__in=ids).values_list('id', flat=True))
+        for attname, ids in wanted.items()
+    }
+
+
+def is_live(row, existing):
+    """True when every object the row points at still exists"""
+    return all(
+        row.get(attname) is None or row[attname] in existing[attname]
+        for attname in REFERENCES
+    )
+
+
+def build_rows(events, existing):
+    """
+    Turn event payloads into unsaved ActivityLog and Feed instances, dated
+    when the event happened rather than when it was drained
+    """
+    activities, feed_items = [], []
+
+    for event in events:
+        activity = event.payload.get('activity')
+        if activity and is_live(activity, existing):
+            if activity.get('actor_id') not in existing.get('actor_id', ()):
+                activity = {**activity, 'actor_id': None}
+            activities.append(ActivityLog(**activity, created_at=event.created_at))
+
+        feed = event.payload.get('feed')
+        if feed and is_live(feed, existing) and feed['actor_id'] in existing.get('actor_id', ()):
+            feed_items.append(Feed(**feed, created_at=event.created_at))
+
+    return activities, feed_items
+
+
+def publish(feed_items, broadcasts):
+    """Run the post-commit side effects of a drained batch"""
+    from .feed_utils import publish_feed_items
+    from .websocket_utils import batched, broadcast_task_update, send_notification_to_user
+
+    broadcasters = {
+        'task': broadcast_task_update,
+        'notification': send_notification_to_user,
+    }
+
+    # Every broadcast of the batch goes out in one channel layer flush
+    with batched():
+        publish_feed_items(feed_items)
+        for broadcast in broadcasts:
+            broadcasters[broadcast['kind']](*broadcast['args'])
+
+
+def drain(batch_size=OUTBOX_BATCH_SIZE):
+    """
+    Process one batch of outbox events and return how many were handled
+
+    Rows are claimed with SKIP LOCKED so concurrent drains never share a
+    batch. Events whose task, project or comment has since been deleted
+    are dropped rather than failing the whole batch.
+    """
+    with transaction.atomic():
+        events = list(
+            OutboxEvent.objects.select_for_update(skip_locked=True).order_by('id')[:batch_size]
+        )
+        if not events:
+            return 0
+
+        rows = [
+            row for event in events
+            for row in (event.payload.get('activity'), event.payload.get('feed'))
+            if row
+        ]
+        activities, feed_items = build_rows(events, existing_ids(rows))
+
+        ActivityLog.objects.bulk_create(activities)
+        Feed.objects.bulk_create(feed_items)
+        OutboxEvent.objects.filter(id__in=[event.id for event in events]).delete()
+
+        broadcasts = [
+            broadcast for event in events
+            for broadcast in event.payload.get('broadcasts', [])
+        ]
+        transaction.on_commit(lambda: publish(feed_items, broadcasts))
+
+    return len(events)
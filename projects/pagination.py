@@ -0,0 +1,124 @@
+import base64
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+INVALID_CURSOR_MESSAGE = 'Invalid cursor'
+
+
+def encode_position(item):
+    """Encode an item's (created_at, id) as an opaque cursor"""
+    position = f'{item.created_at.isoformat()}|{item.id}'
+    return base64.urlsafe_b64encode(position.encode('ascii')).decode('ascii')
+
+
+def decode_position(encoded):
+    """Return the (created_at, id) a cursor points at, or raise NotFound"""
+    try:
+        created_at, pk = base64.urlsafe_b64decode(encoded.encode('ascii')).decode('ascii').split('|')
+        position = (parse_datetime(created_at), int(pk))
+    except (TypeError, ValueError, UnicodeError):
+        raise NotFound(INVALID_CURSOR_MESSAGE)
+
+    if position[0] is None:
+        raise NotFound(INVALID_CURSOR_MESSAGE)
+    return position
+
+
+def after_position(position):
+    """Q matching rows that come after `position` in (-created_at, -id) order"""
+    created_at, pk = position
+    # The AND-ed bound gives the planner an index range to start from; the OR
+    # alone is applied as a filter while walking from the newest row
+    return Q(created_at__lte=created_at) & (
+        Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+    )
+
+
+class FeedPagination(PageNumberPagination):
+    """Custom pagination for feed"""
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination keyed on (created_at, id)
+
+    Enabled when the request carries a `cursor` parameter (empty for the
+    first page). Each page is a `WHERE (created_at, id) < cursor` range
+    scan on the created_at indexes, so it costs the same at any depth and
+    never runs COUNT(*). Requests without a cursor use `fallback_class`,
+    or are left unpaginated when it is None.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    ordering = ('-created_at', '-id')
+    fallback_class = None
+
+    def is_keyset_request(self, request):
+        return self.cursor_query_param in request.query_params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.fallback = None
+        if not self.is_keyset_request(request):
+            if self.fallback_class is None:
+                return None
+            self.fallback = self.fallback_class()
+            return self.fallback.paginate_queryset(queryset, request, view)
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(after_position(position))
+
+        # Fetch one extra row to learn whether there is a next page
+        results = list(queryset[:page_size + 1])
+        self.has_next = len(results) > page_size
+        self.page = results[:page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def decode_cursor(self, request):
+        """Return the (created_at, id) position encoded in the request, if any"""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        return decode_position(encoded)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encode_position(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        if self.fallback is not None:
+            return self.fallback.get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+
+class FeedKeysetPagination(KeysetPagination):
+    """Keyset pagination for the feed, page numbers when no cursor is sent"""
+    fallback_class = FeedPagination
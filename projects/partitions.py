@@ -0,0 +1,263 @@
+"""
+Monthly range partitions for feeds and activity_logs (PostgreSQL)
+
+Both tables are append-only, read newest first and purged by age, so they
+can be range-partitioned on created_at with one partition per month.
+Retention then drops whole partitions, and feed queries bounded on
+created_at only touch the recent ones.
+
+Converting an existing table is done by `manage.py partition_tables
+--convert`: the table is swapped for a partitioned one in a short locked
+transaction and its history is copied back in batches. Future partitions
+are created ahead of time by the create_future_partitions beat task.
+Partitions are named <table>_pYYYY_MM. Rows outside every monthly partition
+(e.g. when the beat task has not run for months) go to the DEFAULT
+partition <table>_pdefault instead of failing to insert; they are moved
+into their month's partition when it is created. On other databases, and
+on tables that have not been converted, every helper here is a no-op.
+"""
+import re
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+PARTITIONED_TABLES = ('feeds', 'activity_logs')
+PARTITION_MONTHS_AHEAD = getattr(settings, 'PARTITION_MONTHS_AHEAD', 3)
+BACKFILL_BATCH_SIZE = 10000
+
+
+def month_start(value):
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(month, count):
+    years, index = divmod(month.month - 1 + count, 12)
+    return month.replace(year=month.year + years, month=index + 1)
+
+
+def partition_name(table, month):
+    return f'{table}_p{month:%Y_%m}'
+
+
+def default_partition_name(table):
+    return f'{table}_pdefault'
+
+
+def legacy_name(table):
+    return f'{table}_legacy'
+
+
+def quote(name):
+    return connection.ops.quote_name(name)
+
+
+def is_partitioned(table):
+    """True when `table` is a partitioned PostgreSQL table"""
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s))',
+            [table]
+        )
+        return cursor.fetchone()[0]
+
+
+def list_partitions(table):
+    """Return [(partition name, month start)] for `table`, oldest first"""
+    if not is_partitioned(table):
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+            'WHERE i.inhparent = to_regclass(%s)',
+            [table]
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    pattern = re.compile(rf'^{re.escape(table)}_p(\d{{4}})_(\d{{2}})$')
+    partitions = []
+    for name in names:
+        match = pattern.match(name)
+        if match:
+            month = timezone.now().replace(
+                year=int(match.group(1)), month=int(match.group(2)),
+                day=1, hour=0, minute=0, second=0, microsecond=0
+            )
+            partitions.append((name, month))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def create_default_partition(table):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS {quote(default_partition_name(table))} '
+            f'PARTITION OF {quote(table)} DEFAULT'
+        )
+
+
+def has_default_rows(table):
+    """True when rows have landed in the default partition"""
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT EXISTS (SELECT 1 FROM {quote(default_partition_name(table))})')
+        return cursor.fetchone()[0]
+
+
+def create_partition(table, month):
+    """
+    Create the partition holding `month` if it does not exist yet, moving
+    in the rows of that month from the default partition
+    """
+    default = quote(default_partition_name(table))
+    bounds = [month, add_months(month, 1)]
+    create_sql = (
+        f'CREATE TABLE IF NOT EXISTS {quote(partition_name(table, month))} '
+        f'PARTITION OF {quote(table)} FOR VALUES FROM (%s) TO (%s)'
+    )
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT EXISTS (SELECT 1 FROM {default} WHERE created_at >= %s AND created_at < %s)',
+            bounds
+        )
+        if not cursor.fetchone()[0]:
+            cursor.execute(create_sql, bounds)
+            return
+
+        # PostgreSQL refuses a partition for rows the default partition holds
+        cursor.execute(f'ALTER TABLE {quote(table)} DETACH PARTITION {default}')
+        cursor.execute(create_sql, bounds)
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM {default} WHERE created_at >= %s AND created_at < %s RETURNING *) '
+            f'INSERT INTO {quote(table)} SELECT * FROM moved',
+            bounds
+        )
+        cursor.execute(f'ALTER TABLE {quote(table)} ATTACH PARTITION {default} DEFAULT')
+
+
+def ensure_partitions(table, months_ahead=PARTITION_MONTHS_AHEAD, since=None):
+    """
+    Make sure partitions exist from `since` (default: this month) through
+    `months_ahead` months from now. Returns the names of partitions created.
+    """
+    if not is_partitioned(table):
+        return []
+
+    create_default_partition(table)
+    existing = {name for name, _ in list_partitions(table)}
+    month = month_start(since or timezone.now())
+    last = add_months(month_start(timezone.now()), months_ahead)
+
+    created = []
+    while month <= last:
+        if partition_name(table, month) not in existing:
+            create_partition(table, month)
+            created.append(partition_name(table, month))
+        month = add_months(month, 1)
+    return created
+
+
+def drop_partitions_before(table, cutoff):
+    """Drop partitions whose rows are all older than `cutoff`; return their names"""
+    dropped = []
+    for name, month in list_partitions(table):
+        if add_months(month, 1) > cutoff:
+            break
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE {quote(name)}')
+        dropped.append(name)
+    return dropped
+
+
+def convert_table(table, months_ahead=PARTITION_MONTHS_AHEAD):
+    """
+    Swap `table` for a partitioned copy of itself
+
+    Runs in one transaction holding an ACCESS EXCLUSIVE lock, but copies no
+    rows: the old table is renamed to <table>_legacy, and the new one gets
+    the same columns, indexes, foreign keys and ID sequence position, plus
+    partitions covering the legacy rows and a default partition. Call
+    backfill() afterwards.
+    """
+    legacy = legacy_name(table)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {quote(table)} IN ACCESS EXCLUSIVE MODE')
+
+        cursor.execute(
+            'SELECT indexname, indexdef FROM pg_indexes WHERE schemaname = current_schema() AND tablename = %s',
+            [table]
+        )
+        indexes = cursor.fetchall()
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = to_regclass(%s) AND contype = 'f'",
+            [table]
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(f'SELECT min(created_at), max(id) FROM {quote(table)}')
+        oldest, max_id = cursor.fetchone()
+
+        # Index names are schema-wide, so move the legacy ones out of the way
+        cursor.execute(f'ALTER TABLE {quote(table)} RENAME TO {quote(legacy)}')
+        for index_name, _ in indexes:
+            cursor.execute(f'ALTER INDEX {quote(index_name)} RENAME TO {quote(index_name[:56] + "_legacy")}')
+
+        cursor.execute(
+            f'CREATE TABLE {quote(table)} (LIKE {quote(legacy)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+            f'PARTITION BY RANGE (created_at)'
+        )
+        # The primary key of a partitioned table must include the partition key
+        cursor.execute(f'ALTER TABLE {quote(table)} ADD PRIMARY KEY (id, created_at)')
+
+        # LIKE does not copy the identity (or serial) ID sequence, which
+        # belongs to the legacy table and is dropped with it, so the new
+        # table gets a sequence of its own that continues after max(id)
+        sequence = f'{table}_partitioned_id_seq'
+        cursor.execute(f'CREATE SEQUENCE {quote(sequence)} OWNED BY {quote(table)}.id')
+        if max_id is not None:
+            cursor.execute('SELECT setval(%s, %s)', [sequence, max_id])
+        cursor.execute(
+            f"ALTER TABLE {quote(table)} ALTER COLUMN id SET DEFAULT nextval('{sequence}'::regclass)"
+        )
+
+        for _, index_def in indexes:
+            if not index_def.startswith('CREATE UNIQUE'):
+                cursor.execute(index_def)
+        for constraint_name, constraint_def in foreign_keys:
+            cursor.execute(f'ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(constraint_name)} {constraint_def}')
+
+        ensure_partitions(table, months_ahead, since=oldest)
+
+
+def backfill(table, batch_size=BACKFILL_BATCH_SIZE):
+    """
+    Copy rows from <table>_legacy into the partitioned table in ID batches
+
+    Each batch commits on its own and skips rows already copied, so the
+    backfill can be interrupted and run again. Yields the rows copied per batch.
+    """
+    legacy = legacy_name(table)
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT min(id), max(id) FROM {quote(legacy)}')
+        low, high = cursor.fetchone()
+    if low is None:
+        return
+
+    start = low - 1
+    while start < high:
+        end = start + batch_size
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {quote(table)} SELECT * FROM {quote(legacy)} '
+                f'WHERE id > %s AND id <= %s ON CONFLICT DO NOTHING',
+                [start, end]
+            )
+            copied = cursor.rowcount
+        yield copied
+        start = end
+
+
+def drop_legacy(table):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {quote(legacy_name(table))}')
@@ -1,5 +1,5 @@
 from rest_framework import permissions
-from organizations.models import Membership
+from organizations.scope import get_request_scope
 
 
 class CanManageProject(permissions.BasePermission):
@@ -34,12 +34,9 @@ class CanManageProject(permissions.BasePermission):
         project = obj if hasattr(obj, 'organization') else obj.project
         
         # Check if user is a member of the organization
-        membership = Membership.objects.filter(
-            user=request.user,
-            organization=project.organization
-        ).first()
+        role = get_request_scope(request).role_in(project.organization_id)
         
-        if not membership:
+        if role is None:
             return False
         
         # Safe methods allowed for all members
@@ -47,7 +44,7 @@ class CanManageProject(permissions.BasePermission):
             return True
         
         # Only ADMIN or MANAGER can modify/delete
-        return membership.role in ['ADMIN', 'MANAGER']
+        return role in ['ADMIN', 'MANAGER']
 
 
 class CanManageTask(permissions.BasePermission):
@@ -77,12 +74,9 @@ class CanManageTask(permissions.BasePermission):
         task = obj
         
         # Check if user is a member of the organization
-        membership = Membership.objects.filter(
-            user=request.user,
-            organization=task.project.organization
-        ).first()
+        role = get_request_scope(request).role_in(task.project.organization_id)
         
-        if not membership:
+        if role is None:
             return False
         
         # Safe methods allowed for all members
@@ -90,11 +84,11 @@ class CanManageTask(permissions.BasePermission):
             return True
         
         # ADMIN or MANAGER can do anything
-        if membership.role in ['ADMIN', 'MANAGER']:
+        if role in ['ADMIN', 'MANAGER']:
             return True
         
         # USERS can only edit tasks assigned to them or reported by them
-        if membership.role == 'USER':
-            return task.assignee == request.user or task.reporter == request.user
+        if role == 'USER':
+            return task.assignee_id == request.user.id or task.reporter_id == request.user.id
         
         return False
\ No newline at end of file
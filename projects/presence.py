@@ -0,0 +1,125 @@
+"""
+Who is watching a task, and who is typing in it
+
+Each open socket on a task room is a member of a Redis sorted set scored
+by its last heartbeat; members silent for PRESENCE_TTL seconds count as
+gone. Instead of broadcasting every join, leave and keystroke to the whole
+room, a consumer that records one calls flush() after PRESENCE_TICK: the
+one that wins the tick lock compares the room's current watchers with the
+last snapshot and sends a single presence_update with the joined, left and
+typing users. Idle rooms are only flushed once per PRESENCE_HEARTBEAT, to
+notice watchers whose sockets died. A user's typing is recorded at most
+once per TYPING_INTERVAL.
+"""
+import time
+from django.conf import settings
+from django_redis import get_redis_connection
+
+PRESENCE_TTL = getattr(settings, 'PRESENCE_TTL', 45)
+PRESENCE_HEARTBEAT = getattr(settings, 'PRESENCE_HEARTBEAT', 15)
+PRESENCE_TICK = getattr(settings, 'PRESENCE_TICK', 1.0)
+TYPING_INTERVAL = getattr(settings, 'TYPING_INTERVAL', 3.0)
+
+# flush() result when another socket is flushing the room this tick
+BUSY = 'busy'
+
+
+def room_key(task_id, part=None):
+    key = f'presence:task:{task_id}'
+    return f'{key}:{part}' if part else key
+
+
+def member(user_id, channel_name):
+    return f'{user_id}:{channel_name}'
+
+
+def get_connection():
+    return get_redis_connection('default')
+
+
+def heartbeat(task_id, user, channel_name):
+    """Record (or refresh) a socket watching the task"""
+    pipe = get_connection().pipeline()
+    pipe.zadd(room_key(task_id), {member(user.id, channel_name): time.time()})
+    pipe.hset(room_key(task_id, 'emails'), user.id, user.email)
+    for key in (room_key(task_id), room_key(task_id, 'emails')):
+        pipe.expire(key, PRESENCE_TTL * 2)
+    pipe.execute()
+
+
+def leave(task_id, user_id, channel_name):
+    con = get_connection()
+    con.zrem(room_key(task_id), member(user_id, channel_name))
+    if not con.zcard(room_key(task_id)):
+        # Nobody is left to tell; the next watcher starts from a clean room
+        con.delete(room_key(task_id, 'snapshot'))
+
+
+def mark_typing(task_id, user_id):
+    """Record that the user is typing; False when they already did recently"""
+    con = get_connection()
+    if not con.set(room_key(task_id, f'typing:{user_id}'), 1, nx=True, px=int(TYPING_INTERVAL * 1000)):
+        return False
+    pipe = con.pipeline()
+    pipe.sadd(room_key(task_id, 'typing'), user_id)
+    pipe.expire(room_key(task_id, 'typing'), PRESENCE_TTL)
+    pipe.execute()
+    return True
+
+
+def current_user_ids(con, task_id):
+    """IDs of users with at least one live socket in the room"""
+    con.zremrangebyscore(room_key(task_id), '-inf', time.time() - PRESENCE_TTL)
+    members = con.zrange(room_key(task_id), 0, -1)
+    return {int(item.split(b':', 1)[0]) for item in members}
+
+
+def describe(con, task_id, user_ids):
+    """Return [{'user_id', 'user_email'}] for the given users"""
+    user_ids = sorted(user_ids)
+    if not user_ids:
+        return []
+    emails = con.hmget(room_key(task_id, 'emails'), user_ids)
+    return [
+        {'user_id': user_id, 'user_email': email.decode() if email else None}
+        for user_id, email in zip(user_ids, emails)
+    ]
+
+
+def watchers(task_id):
+    """Users currently watching the task"""
+    con = get_connection()
+    return describe(con, task_id, current_user_ids(con, task_id))
+
+
+def flush(task_id):
+    """
+    Collect the room's presence changes since the last tick
+
+    Returns {'joined', 'left', 'typing'} when this caller won the tick and
+    something changed, BUSY when another caller holds the tick, otherwise None.
+    """
+    con = get_connection()
+    if not con.set(room_key(task_id, 'tick'), 1, nx=True, px=int(PRESENCE_TICK * 1000)):
+        return BUSY
+
+    current = current_user_ids(con, task_id)
+    previous = {int(user_id) for user_id in con.smembers(room_key(task_id, 'snapshot'))}
+
+    pipe = con.pipeline()
+    pipe.smembers(room_key(task_id, 'typing'))
+    pipe.delete(room_key(task_id, 'typing'))
+    pipe.delete(room_key(task_id, 'snapshot'))
+    if current:
+        pipe.sadd(room_key(task_id, 'snapshot'), *current)
+        pipe.expire(room_key(task_id, 'snapshot'), PRESENCE_TTL * 2)
+    typing = {int(user_id) for user_id in pipe.execute()[0]}
+
+    joined, left = current - previous, previous - current
+    if not (joined or left or typing):
+        return None
+    return {
+        'joined': describe(con, task_id, joined),
+        'left': describe(con, task_id, left),
+        'typing': describe(con, task_id, typing & current),
+    }
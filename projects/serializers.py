@@ -1,34 +1,64 @@
 from rest_framework import serializers
 from .models import Project, Task, Comment, ActivityLog, Feed
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from .outbox import record_event, task_broadcast, user_notification
 
 User = get_user_model()
 
 
-class ProjectSerializer(serializers.ModelSerializer):
+class EagerLoadingMixin:
+    """
+    Serializer mixin declaring the relations its fields read
+    Viewsets pass their queryset through setup_eager_loading so listing N
+    rows costs a fixed number of queries instead of one per row.
+    """
+    select_related_fields = ()
+    prefetch_related_fields = ()
+    
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        if cls.select_related_fields:
+            queryset = queryset.select_related(*cls.select_related_fields)
+        if cls.prefetch_related_fields:
+            queryset = queryset.prefetch_related(*cls.prefetch_related_fields)
+        return queryset
+
+
+class ProjectSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     """Serializer for Project model"""
     
+    select_related_fields = ('owner', 'organization')
+    
     owner_email = serializers.EmailField(source='owner.email', read_only=True)
     organization_name = serializers.CharField(source='organization.name', read_only=True)
     task_count = serializers.SerializerMethodField()
+    task_status_counts = serializers.SerializerMethodField()
     
     class Meta:
         model = Project
         fields = [
             'id', 'name', 'description', 'organization', 'organization_name',
             'owner', 'owner_email', 'status', 'start_date', 'end_date',
-            'task_count', 'created_at', 'updated_at'
+            'task_count', 'task_status_counts', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
     
     def get_task_count(self, obj):
         """Get total number of tasks in project"""
-        return obj.tasks.count()
+        return obj.get_task_counts()['total']
+    
+    def get_task_status_counts(self, obj):
+        """Get number of tasks per status"""
+        counts = obj.get_task_counts()
+        return {status: counts[status] for status in Project.STATUS_COUNTER_FIELDS}
 
 
-class TaskSerializer(serializers.ModelSerializer):
+class TaskSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     """Serializer for Task model"""
     
+    select_related_fields = ('assignee', 'reporter', 'project')
+    
     assignee_email = serializers.EmailField(source='assignee.email', read_only=True)
     reporter_email = serializers.EmailField(source='reporter.email', read_only=True)
     project_name = serializers.CharField(source='project.name', read_only=True)
@@ -74,6 +104,13 @@ class TaskSerializer(serializers.ModelSerializer):
             send_task_assignment_email.delay(task.id, task.assignee.id)
         
         return task
+    
+    def update(self, instance, validated_data):
+        """Save with the request user as the actor of any activity"""
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(actor=self.context['request'].user)
+        return instance
 
 
 class TaskStatusUpdateSerializer(serializers.Serializer):
@@ -92,9 +129,12 @@ class TaskStatusUpdateSerializer(serializers.Serializer):
         return value
 
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     """Serializer for Comment model"""
     
+    select_related_fields = ('author', 'task')
+    prefetch_related_fields = ('mentioned_users',)
+    
     author_email = serializers.EmailField(source='author.email', read_only=True)
     author_name = serializers.SerializerMethodField()
     task_title = serializers.CharField(source='task.title', read_only=True)
@@ -114,83 +154,83 @@ class CommentSerializer(serializers.ModelSerializer):
     
     def get_mentioned_users_emails(self, obj):
         """Get list of mentioned user emails"""
-        return list(obj.mentioned_users.values_list('email', flat=True))
+        # Read through the prefetch cache instead of a query per comment
+        return [user.email for user in obj.mentioned_users.all()]
     
     def create(self, validated_data):
         """Set author to current user and process mentions"""
         validated_data['author'] = self.context['request'].user
-        comment = super().create(validated_data)
-        
-        # Create activity log
-        ActivityLog.objects.create(
-            actor=comment.author,
-            action='COMMENT_ADDED',
-            description=f'Added comment on task "{comment.task.title}"',
-            task=comment.task,
-            project=comment.task.project,
-            comment=comment,
-            metadata={
-                'comment_id': comment.id,
-                'content_preview': comment.content[:100],
-            }
-        )
         
-        # Create feed item
-        from .feed_utils import create_feed_item
-        create_feed_item(
-            actor=comment.author,
-            activity_type='COMMENT_ADDED',
-            title=f'commented on "{comment.task.title}"',
-            description=comment.content[:200],
-            task=comment.task,
-            project=comment.task.project,
-            comment=comment,
-            organization=comment.task.project.organization,
-            metadata={
-                'comment_preview': comment.content[:100],
-            }
-        )
+        with transaction.atomic():
+            comment = super().create(validated_data)
+            task = comment.task
+            mentioned_user_ids = list(comment.mentioned_users.values_list('id', flat=True))
+            
+            # Broadcast comment via WebSocket
+            broadcasts = [
+                task_broadcast(task.id, 'comment_added', {
+                    'comment_id': comment.id,
+                    'task_id': task.id,
+                    'author': comment.author.email,
+                    'content': comment.content,
+                    'created_at': comment.created_at.isoformat(),
+                })
+            ]
+            
+            # Notify mentioned users in real-time
+            for user_id in mentioned_user_ids:
+                broadcasts.append(user_notification(user_id, 'mentioned_in_comment', {
+                    'comment_id': comment.id,
+                    'task_id': task.id,
+                    'task_title': task.title,
+                    'author': comment.author.email,
+                    'content_preview': comment.content[:100],
+                }))
+            
+            # Activity log and feed item are written by the outbox drain
+            record_event(
+                'COMMENT_ADDED',
+                activity={
+                    'actor_id': comment.author_id,
+                    'action': 'COMMENT_ADDED',
+                    'description': f'Added comment on task "{task.title}"',
+                    'task_id': task.id,
+                    'project_id': task.project_id,
+                    'comment_id': comment.id,
+                    'metadata': {
+                        'comment_id': comment.id,
+                        'content_preview': comment.content[:100],
+                    },
+                },
+                feed={
+                    'actor_id': comment.author_id,
+                    'activity_type': 'COMMENT_ADDED',
+                    'title': f'commented on "{task.title}"',
+                    'description': comment.content[:200],
+                    'task_id': task.id,
+                    'project_id': task.project_id,
+                    'comment_id': comment.id,
+                    'organization_id': task.project.organization_id,
+                    'metadata': {
+                        'comment_preview': comment.content[:100],
+                    },
+                },
+                broadcasts=broadcasts,
+            )
         
         # Send mention notifications asynchronously
-        mentioned_user_ids = list(comment.mentioned_users.values_list('id', flat=True))
         if mentioned_user_ids:
             from .tasks import send_comment_notification
             send_comment_notification.delay(comment.id, mentioned_user_ids)
         
-        # Broadcast comment via WebSocket
-        from .websocket_utils import broadcast_task_update, send_notification_to_user
-        broadcast_task_update(
-            comment.task.id,
-            'comment_added',
-            {
-                'comment_id': comment.id,
-                'task_id': comment.task.id,
-                'author': comment.author.email,
-                'content': comment.content,
-                'created_at': comment.created_at.isoformat(),
-            }
-        )
-        
-        # Notify mentioned users in real-time
-        for user_id in mentioned_user_ids:
-            send_notification_to_user(
-                user_id,
-                'mentioned_in_comment',
-                {
-                    'comment_id': comment.id,
-                    'task_id': comment.task.id,
-                    'task_title': comment.task.title,
-                    'author': comment.author.email,
-                    'content_preview': comment.content[:100],
-                }
-            )
-        
         return comment
 
 
-class ActivityLogSerializer(serializers.ModelSerializer):
+class ActivityLogSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     """Serializer for Activity Log"""
     
+    select_related_fields = ('actor', 'task', 'project')
+    
     actor_email = serializers.EmailField(source='actor.email', read_only=True)
     actor_name = serializers.SerializerMethodField()
     task_title = serializers.CharField(source='task.title', read_only=True)
@@ -203,15 +243,17 @@ class ActivityLogSerializer(serializers.ModelSerializer):
             'task', 'task_title', 'project', 'project_name', 'comment',
             'metadata', 'created_at'
         ]
-        read_only_fields = '__all__'
+        read_only_fields = fields
     
     def get_actor_name(self, obj):
         """Get actor's full name"""
         return obj.actor.get_full_name() if obj.actor else 'System'
     
-class FeedSerializer(serializers.ModelSerializer):
+class FeedSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     """Serializer for Feed model with optimized queries"""
     
+    select_related_fields = ('actor', 'task', 'project', 'comment', 'organization')
+    
     actor_email = serializers.EmailField(source='actor.email', read_only=True)
     actor_name = serializers.SerializerMethodField()
     task_title = serializers.CharField(source='task.title', read_only=True)
@@ -227,7 +269,7 @@ class FeedSerializer(serializers.ModelSerializer):
             'project_name', 'comment', 'organization', 'organization_name',
             'metadata', 'created_at', 'time_ago'
         ]
-        read_only_fields = '__all__'
+        read_only_fields = fields
     
     def get_actor_name(self, obj):
         """Get actor's full name"""
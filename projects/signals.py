@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from organizations.models import Membership
+from .feed_utils import bump_feed_generation
+from .websocket_utils import notify_membership_changed
+from .models import Project, Task
+from .timeline import drop_timelines, user_timeline_key, actor_timeline_key
+
+
+@receiver([post_save, post_delete], sender=Membership)
+def reset_member_feeds(sender, instance, **kwargs):
+    """Rebuild a user's feeds after they join or leave an organization"""
+    bump_feed_generation('user', instance.user_id)
+    drop_timelines(
+        user_timeline_key(instance.user_id),
+        actor_timeline_key(instance.user_id),
+    )
+    # Live feed sockets switch organization groups without reconnecting
+    transaction.on_commit(lambda: notify_membership_changed(instance.user_id))
+
+
+@receiver(post_delete, sender=Task)
+def decrement_project_counters(sender, instance, **kwargs):
+    """Keep denormalized Project task counters in step with deletions"""
+    if getattr(settings, 'PROJECT_TASK_COUNTERS', False):
+        Project.adjust_task_counts(instance.project_id, {
+            'task_count': -1,
+            Project.STATUS_COUNTER_FIELDS[instance.status]: -1,
+        })
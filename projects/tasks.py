@@ -1,9 +1,13 @@
 from celery import shared_task
 from django.core.mail import send_mail
 from django.contrib.auth import get_user_model
+from django.db.models import Count, F
 from django.utils import timezone
 from datetime import timedelta
-from .models import Task, ActivityLog, Feed
+from itertools import groupby
+from operator import attrgetter
+from .models import Task, ActivityLog
+from . import mail
 
 User = get_user_model()
 
@@ -78,6 +82,7 @@ def send_comment_notification(self, comment_id, mentioned_user_ids):
         comment = Comment.objects.select_related('task', 'author').get(id=comment_id)
         mentioned_users = User.objects.filter(id__in=mentioned_user_ids)
         
+        messages = []
         for user in mentioned_users:
             subject = f'You were mentioned in a comment'
             message = f"""
@@ -92,22 +97,26 @@ def send_comment_notification(self, comment_id, mentioned_user_ids):
             Best regards,
             Project Management Team
             """
-            
-            send_mail(
-                subject=subject,
-                message=message,
-                from_email='noreply@projectmanagement.com',
-                recipient_list=[user.email],
-                fail_silently=False,
-            )
-            
-            print(f"✅ Mention notification sent to {user.email}")
-        
-        return f"Notifications sent to {len(mentioned_users)} users"
+            messages.append(mail.message(subject, message, user.email))
         
     except Exception as exc:
         print(f"❌ Error sending mention notifications: {exc}")
         raise self.retry(exc=exc, countdown=60)
+    
+    # Delivery failures are retried per chunk by send_mail_chunk, not here
+    sent, retrying = mail.send_batch(messages)
+    print(f"✅ Mention notifications sent to {sent} users")
+    return f"Notifications sent to {sent} users, {retrying} queued for retry"
+
+
+WEEKLY_SUMMARY_CHUNK_SIZE = 1000
+
+
+def count_by(queryset, field):
+    """Return {field value: row count} from one GROUP BY query"""
+    return dict(
+        queryset.order_by().values_list(field).annotate(total=Count('id'))
+    )
 
 
 @shared_task
@@ -115,6 +124,9 @@ def send_weekly_summary():
     """
     Send weekly summary email to all active users
     Runs every Monday at 9 AM
+    
+    Each metric is one GROUP BY over all users, merged in memory; users are
+    then streamed in chunks and each chunk's emails go out in a subtask.
     """
     print("📧 Starting weekly summary email job...")
     
@@ -122,46 +134,80 @@ def send_weekly_summary():
     end_date = timezone.now()
     start_date = end_date - timedelta(days=7)
     
+    tasks_created = count_by(
+        Task.objects.filter(created_at__gte=start_date),
+        'reporter_id'
+    )
+    tasks_completed = count_by(
+        Task.objects.filter(status='DONE', updated_at__gte=start_date),
+        'assignee_id'
+    )
+    tasks_pending = count_by(
+        Task.objects.filter(status__in=['TODO', 'IN_PROGRESS']),
+        'assignee_id'
+    )
+    activities = count_by(
+        ActivityLog.objects.filter(created_at__gte=start_date),
+        'actor_id'
+    )
+    
     # Get all active users
-    users = User.objects.filter(is_active=True)
+    users = (
+        User.objects.filter(is_active=True)
+        .only('id', 'email', 'first_name', 'last_name')
+        .order_by('id')
+    )
     
-    for user in users:
-        # Get user's tasks
-        tasks_created = Task.objects.filter(
-            reporter=user,
-            created_at__gte=start_date
-        ).count()
-        
-        tasks_completed = Task.objects.filter(
-            assignee=user,
-            status='DONE',
-            updated_at__gte=start_date
-        ).count()
-        
-        tasks_pending = Task.objects.filter(
-            assignee=user,
-            status__in=['TODO', 'IN_PROGRESS']
-        ).count()
-        
-        # Get user's activities
-        activities = ActivityLog.objects.filter(
-            actor=user,
-            created_at__gte=start_date
-        ).count()
-        
-        subject = f'Weekly Summary - {start_date.strftime("%B %d")} to {end_date.strftime("%B %d")}'
+    period = [start_date.strftime("%B %d"), end_date.strftime("%B %d")]
+    chunk = []
+    chunks = 0
+    for user in users.iterator(chunk_size=WEEKLY_SUMMARY_CHUNK_SIZE):
+        chunk.append({
+            'email': user.email,
+            'name': user.get_full_name(),
+            'tasks_created': tasks_created.get(user.id, 0),
+            'tasks_completed': tasks_completed.get(user.id, 0),
+            'tasks_pending': tasks_pending.get(user.id, 0),
+            'activities': activities.get(user.id, 0),
+        })
+        if len(chunk) >= WEEKLY_SUMMARY_CHUNK_SIZE:
+            send_weekly_summary_chunk.delay(chunk, period)
+            chunk = []
+            chunks += 1
+    
+    if chunk:
+        send_weekly_summary_chunk.delay(chunk, period)
+        chunks += 1
+    
+    print(f"📧 Weekly summary queued in {chunks} chunks")
+    return f"Weekly summary queued in {chunks} chunks"
+
+
+@shared_task
+def send_weekly_summary_chunk(summaries, period):
+    """
+    Email one chunk of weekly summaries
+    
+    Args:
+        summaries: Per-user stats built by send_weekly_summary
+        period: [start, end] of the week, already formatted
+    """
+    subject = f'Weekly Summary - {period[0]} to {period[1]}'
+    
+    messages = []
+    for summary in summaries:
         message = f"""
-        Hi {user.get_full_name()},
+        Hi {summary['name']},
         
         Here's your weekly summary:
         
         📊 Your Activity This Week:
-        - Tasks Created: {tasks_created}
-        - Tasks Completed: {tasks_completed}
-        - Total Activities: {activities}
+        - Tasks Created: {summary['tasks_created']}
+        - Tasks Completed: {summary['tasks_completed']}
+        - Total Activities: {summary['activities']}
         
         📋 Current Status:
-        - Pending Tasks: {tasks_pending}
+        - Pending Tasks: {summary['tasks_pending']}
         
         Keep up the great work!
         
@@ -169,94 +215,171 @@ def send_weekly_summary():
         Project Management Team
         """
         
-        send_mail(
-            subject=subject,
-            message=message,
-            from_email='noreply@projectmanagement.com',
-            recipient_list=[user.email],
-            fail_silently=True,
-        )
-        
-        print(f"✅ Weekly summary sent to {user.email}")
+        messages.append(mail.message(subject, message, summary['email']))
     
-    print(f"📧 Weekly summary sent to {users.count()} users")
-    return f"Weekly summary sent to {users.count()} users"
+    sent, retrying = mail.send_batch(messages)
+    print(f"📧 Weekly summary sent to {sent} users")
+    return f"Weekly summary sent to {sent} users, {retrying} queued for retry"
 
 
 @shared_task
 def cleanup_old_activities():
     """
-    Clean up activity logs older than 90 days
+    Purge activity logs and feed items past their retention period
     Runs daily at 2 AM
+    
+    Deletes in small PK-range batches within a time budget (see
+    projects.retention); an unfinished run continues in a follow-up task.
     """
+    from .retention import run_retention
+    
     print("🧹 Starting cleanup of old activity logs...")
     
-    cutoff_date = timezone.now() - timedelta(days=90)
+    results = run_retention()
+    for result in results:
+        print(
+            f"🧹 {result['table']} (org {result['organization_id'] or 'default'}): "
+            f"deleted {result['deleted']} rows at {result['rows_per_second']} rows/sec"
+        )
     
-    # Delete old activity logs
-    deleted_count = ActivityLog.objects.filter(
-        created_at__lt=cutoff_date
-    ).delete()[0]
+    deleted = sum(result['deleted'] for result in results)
+    if not all(result['finished'] for result in results):
+        # Resume from the saved checkpoint shortly
+        cleanup_old_activities.apply_async(countdown=60)
+        return f"Cleaned up {deleted} rows, continuing in a follow-up run"
     
-    # Delete old feed items
-    deleted_feed = Feed.objects.filter(
-        created_at__lt=cutoff_date
-    ).delete()[0]
+    return f"Cleaned up {deleted} rows"
+
+
+@shared_task
+def create_future_partitions():
+    """
+    Create the monthly partitions of feeds and activity_logs ahead of time
+    Runs daily; does nothing for tables that are not partitioned
+    """
+    from .partitions import PARTITIONED_TABLES, ensure_partitions, is_partitioned, has_default_rows
     
-    print(f"🧹 Cleaned up {deleted_count} activity logs and {deleted_feed} feed items")
-    return f"Cleaned up {deleted_count} activity logs and {deleted_feed} feed items"
+    created = [name for table in PARTITIONED_TABLES for name in ensure_partitions(table)]
+    for name in created:
+        print(f"🗂️ Created partition {name}")
+    
+    # Rows in a default partition are outside every monthly partition
+    for table in PARTITIONED_TABLES:
+        if is_partitioned(table) and has_default_rows(table):
+            print(f"⚠️ {table} has rows in its default partition; check PARTITION_MONTHS_AHEAD")
+    return f"Created {len(created)} partitions"
+
+
+REMINDER_CHUNK_SIZE = 500
+
+
+def send_reminder_digests(messages, task_ids):
+    """Send a chunk of reminder digests and mark their tasks as reminded"""
+    sent, retrying = mail.send_batch(messages)
+    Task.objects.filter(id__in=task_ids).update(reminder_sent_for=F('due_date'))
+    return sent, retrying
 
 
 @shared_task(bind=True, max_retries=3)
 def send_due_date_reminders(self):
     """
-    Send reminder emails for tasks due in the next 24 hours
+    Send each assignee one digest of their open tasks due tomorrow
+    Runs hourly; a task is reminded once per due date, so reruns and
+    retries never send the same reminder twice. "Tomorrow" is the UTC date
+    (users have no timezone of their own), so the reminder goes out during
+    the UTC day before the due date.
     """
+    print("⏰ Checking for tasks with upcoming due dates...")
+    
+    tomorrow = timezone.now().date() + timedelta(days=1)
+    
+    upcoming_tasks = (
+        Task.objects.filter(
+            due_date=tomorrow,
+            status__in=['TODO', 'IN_PROGRESS'],
+            assignee__isnull=False
+        )
+        .exclude(reminder_sent_for=F('due_date'))
+        .select_related('assignee', 'project')
+        .order_by('assignee_id', 'due_date', 'id')
+    )
+    
+    sent = retrying = 0
+    messages, task_ids = [], []
     try:
-        print("⏰ Checking for tasks with upcoming due dates...")
-        
-        tomorrow = timezone.now() + timedelta(days=1)
-        today = timezone.now()
-        
-        # Get tasks due tomorrow
-        upcoming_tasks = Task.objects.filter(
-            due_date__date=tomorrow.date(),
-            status__in=['TODO', 'IN_PROGRESS']
-        ).select_related('assignee', 'project')
-        
-        for task in upcoming_tasks:
-            if task.assignee:
-                subject = f'Reminder: Task "{task.title}" is due tomorrow'
-                message = f"""
-                Hi {task.assignee.get_full_name()},
+        for _, tasks in groupby(upcoming_tasks.iterator(chunk_size=REMINDER_CHUNK_SIZE), key=attrgetter('assignee_id')):
+            tasks = list(tasks)
+            assignee = tasks[0].assignee
+            
+            task_lines = "\n".join(
+                f"                - {task.title} ({task.project.name}) - due {task.due_date}, "
+                f"{task.priority} priority, {task.status}"
+                for task in tasks
+            )
+            subject = f'Reminder: {len(tasks)} task(s) due tomorrow'
+            message = f"""
+                Hi {assignee.get_full_name()},
                 
-                This is a reminder that your task is due tomorrow:
+                These tasks assigned to you are due tomorrow:
                 
-                Task: {task.title}
-                Project: {task.project.name}
-                Due Date: {task.due_date}
-                Priority: {task.priority}
-                Status: {task.status}
+{task_lines}
                 
-                Please make sure to complete it on time.
+                Please make sure to complete them on time.
                 
                 Best regards,
                 Project Management Team
                 """
-                
-                send_mail(
-                    subject=subject,
-                    message=message,
-                    from_email='noreply@projectmanagement.com',
-                    recipient_list=[task.assignee.email],
-                    fail_silently=False,
-                )
-                
-                print(f"✅ Due date reminder sent to {task.assignee.email} for task: {task.title}")
+            messages.append(mail.message(subject, message, assignee.email))
+            task_ids.extend(task.id for task in tasks)
+            
+            if len(messages) >= REMINDER_CHUNK_SIZE:
+                chunk_sent, chunk_retrying = send_reminder_digests(messages, task_ids)
+                sent += chunk_sent
+                retrying += chunk_retrying
+                messages, task_ids = [], []
         
-        print(f"⏰ Sent {upcoming_tasks.count()} due date reminders")
-        return f"Sent {upcoming_tasks.count()} due date reminders"
+        if messages:
+            chunk_sent, chunk_retrying = send_reminder_digests(messages, task_ids)
+            sent += chunk_sent
+            retrying += chunk_retrying
         
     except Exception as exc:
+        # Chunks already sent are marked, so the retry only picks up the rest
         print(f"❌ Error sending due date reminders: {exc}")
-        raise self.retry(exc=exc, countdown=300)  # Retry after 5 minutes
\ No newline at end of file
+        raise self.retry(exc=exc, countdown=300)  # Retry after 5 minutes
+    
+    print(f"⏰ Sent {sent} due date reminder digests")
+    return f"Sent {sent} due date reminder digests, {retrying} queued for retry"
+
+
+@shared_task(bind=True, max_retries=3)
+def send_mail_chunk(self, messages):
+    """
+    Retry delivery of one chunk of messages from mail.send_batch
+    
+    Args:
+        messages: Message dicts built by mail.message
+    """
+    sent, failed_chunks = mail.deliver(messages)
+    failed = [item for chunk in failed_chunks for item in chunk]
+    if failed:
+        # Only the messages that failed again go round once more
+        raise self.retry(args=[failed], countdown=60)
+    return f"Sent {sent} emails"
+
+@shared_task
+def drain_outbox(max_batches=20):
+    """
+    Turn pending outbox events into activity logs, feed items and broadcasts
+    Runs every few seconds from beat; stops early once the outbox is empty
+    """
+    from .outbox import drain
+    
+    processed = 0
+    for _ in range(max_batches):
+        count = drain()
+        processed += count
+        if not count:
+            break
+    
+    return f"Drained {processed} outbox events"
@@ -1,3 +1,492 @@
-from django.test import TestCase
+import time
+from datetime import timedelta
+from unittest import mock, skipUnless
+from django.core import mail
+from django.core.cache import cache, caches
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from users.models import CustomUser
+from organizations.models import Organization, Membership
+from .models import Project, Task, Comment, ActivityLog, Feed, OutboxEvent
+from . import partitions, retention
+from .feed_cache import FEED_CACHE_ALIAS, pack_page, unpack_page
+from .feed_utils import (
+    FEED_GENERATION_TTL, bump_feed_generation, generation_cache, generation_key, get_feed_version
+)
+from .board import build_board
+from .tasks import drain_outbox, send_due_date_reminders
+from .views import ProjectViewSet, TaskViewSet, CommentViewSet, ActivityLogViewSet, FeedViewSet
 
-# Create your tests here.
+
+class ListQueryCountTests(TestCase):
+    """List endpoints run the same number of queries however many rows they return"""
+
+    def setUp(self):
+        # Rate limits are not what is measured here; keep them out of the way
+        for viewset in (ProjectViewSet, TaskViewSet, CommentViewSet, ActivityLogViewSet, FeedViewSet):
+            patcher = mock.patch.object(viewset, 'throttle_classes', [])
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.user = CustomUser.objects.create_user('owner@example.com', 'password')
+        self.organization = Organization.objects.create(name='Acme', owner=self.user)
+        Membership.objects.create(user=self.user, organization=self.organization, role='ADMIN')
+        self.project = Project.objects.create(name='Launch', organization=self.organization, owner=self.user)
+        self.task = Task.objects.create(title='First', project=self.project, reporter=self.user)
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_rows(self, create, count):
+        for index in range(count):
+            create(index)
+
+    def assertListQueries(self, url, create, num, params=None):
+        """Request `url` with one row and with five; both must run `num` queries"""
+        create(0)
+        # Resolve and cache the membership scope before measuring
+        self.client.get(url, params)
+
+        for total in (1, 5):
+            self.create_rows(create, total - self.row_count(url, params))
+            with self.assertNumQueries(num):
+                response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(self.row_count(url, params), total)
+
+    def row_count(self, url, params=None):
+        data = self.client.get(url, params).data
+        return len(data['results'] if isinstance(data, dict) else data)
+
+    def test_project_list(self):
+        def create(index):
+            project = Project.objects.create(
+                name=f'Project {index}', organization=self.organization, owner=self.user
+            )
+            Task.objects.create(title='Task', project=project, reporter=self.user, assignee=self.user)
+
+        Project.objects.all().delete()
+        self.assertListQueries('/api/projects/', create, 1)
+
+    def test_task_list(self):
+        def create(index):
+            Task.objects.create(title=f'Task {index}', project=self.project, reporter=self.user, assignee=self.user)
+
+        Task.objects.all().delete()
+        self.assertListQueries('/api/tasks/', create, 1)
+
+    def test_comment_list(self):
+        def create(index):
+            Comment.objects.create(task=self.task, author=self.user, content=f'Comment {index}')
+
+        self.assertListQueries('/api/comments/', create, 2)
+
+    def test_activity_list(self):
+        def create(index):
+            ActivityLog.objects.create(
+                actor=self.user, action='TASK_UPDATED', description=f'Update {index}',
+                task=self.task, project=self.project
+            )
+
+        ActivityLog.objects.all().delete()
+        self.assertListQueries('/api/activity/', create, 1)
+
+    def test_feed_list(self):
+        def create(index):
+            Feed.objects.create(
+                actor=self.user, activity_type='TASK_UPDATED', title=f'Update {index}',
+                task=self.task, project=self.project, organization=self.organization
+            )
+
+        Feed.objects.all().delete()
+        # Cursor pages are never cached, so every request hits the database
+        self.assertListQueries('/api/feed/', create, 1, {'cursor': ''})
+
+
+@override_settings(PROJECT_TASK_COUNTERS=True)
+class TaskCounterTests(TestCase):
+    """Project task counters follow creates, moves and status changes"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('owner@example.com', 'password')
+        self.organization = Organization.objects.create(name='Acme', owner=self.user)
+        self.project = Project.objects.create(name='Launch', organization=self.organization, owner=self.user)
+        self.task = Task.objects.create(title='First', project=self.project, reporter=self.user)
+
+    def assertCounts(self, total, todo, in_progress):
+        self.project.refresh_from_db()
+        self.assertEqual(
+            (self.project.task_count, self.project.todo_task_count, self.project.in_progress_task_count),
+            (total, todo, in_progress),
+        )
+
+    def test_loaded_task(self):
+        self.assertCounts(1, 1, 0)
+        task = Task.objects.get(pk=self.task.pk)
+        task.status = 'IN_PROGRESS'
+        task.save()
+        self.assertCounts(1, 0, 1)
+
+    def test_task_built_by_hand_is_not_counted_as_a_create(self):
+        def build(status):
+            return Task(
+                pk=self.task.pk, title='First', project=self.project, reporter=self.user,
+                status=status, created_at=self.task.created_at,
+            )
+
+        build('IN_PROGRESS').save()
+        self.assertCounts(1, 0, 1)
+        # A plain re-save changes nothing
+        build('IN_PROGRESS').save()
+        self.assertCounts(1, 0, 1)
+
+
+class TaskSaveTests(TestCase):
+    """Task.save records events whether or not the task was loaded from the DB"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('owner@example.com', 'password')
+        self.organization = Organization.objects.create(name='Acme', owner=self.user)
+        self.project = Project.objects.create(name='Launch', organization=self.organization, owner=self.user)
+        self.task = Task.objects.create(title='First', project=self.project, reporter=self.user)
+
+    def status_events(self):
+        return OutboxEvent.objects.filter(event_type='STATUS_CHANGED')
+
+    def test_status_change_of_task_built_by_hand(self):
+        Task(
+            pk=self.task.pk, title='First', project=self.project, reporter=self.user,
+            status='IN_PROGRESS', created_at=self.task.created_at,
+        ).save()
+        event = self.status_events().get()
+        self.assertEqual(event.payload['activity']['metadata'], {'old_status': 'TODO', 'new_status': 'IN_PROGRESS'})
+
+    def test_save_without_changes_still_saves(self):
+        task = Task.objects.get(pk=self.task.pk)
+        with mock.patch('django.db.models.signals.post_save.send') as send:
+            task.save()
+        send.assert_called_once()
+        self.assertGreater(Task.objects.get(pk=task.pk).updated_at, self.task.updated_at)
+        self.assertFalse(self.status_events().exists())
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Table partitioning requires PostgreSQL')
+class PartitionTests(TestCase):
+    """Converting feeds to monthly partitions keeps rows, IDs and inserts working"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('owner@example.com', 'password')
+        self.organization = Organization.objects.create(name='Acme', owner=self.user)
+        # Deferred FK checks pending in the test transaction would block the DDL
+        with connection.cursor() as cursor:
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+    def create_feed(self, created_at=None):
+        return Feed.objects.create(
+            actor=self.user, activity_type='TASK_CREATED', title='Created',
+            organization=self.organization, created_at=created_at or timezone.now(),
+        )
+
+    def partition_of(self, feed):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT tableoid::regclass::text FROM feeds WHERE id = %s', [feed.id])
+            return cursor.fetchone()[0]
+
+    def test_convert_insert_and_drop(self):
+        this_month = partitions.month_start(timezone.now())
+        old_month = partitions.add_months(this_month, -2)
+        old = self.create_feed(old_month + timedelta(days=3))
+
+        partitions.convert_table('feeds', months_ahead=1)
+        self.assertEqual(sum(partitions.backfill('feeds')), 1)
+        partitions.drop_legacy('feeds')
+        self.assertEqual(self.partition_of(old), partitions.partition_name('feeds', old_month))
+
+        # New rows get IDs after the copied ones and land in this month
+        new = self.create_feed()
+        self.assertGreater(new.id, old.id)
+        self.assertEqual(self.partition_of(new), partitions.partition_name('feeds', this_month))
+
+        # Past the last partition, rows wait in the default partition
+        later_month = partitions.add_months(this_month, 6)
+        later = self.create_feed(later_month + timedelta(days=1))
+        self.assertEqual(self.partition_of(later), partitions.default_partition_name('feeds'))
+        partitions.ensure_partitions('feeds', months_ahead=6)
+        self.assertEqual(self.partition_of(later), partitions.partition_name('feeds', later_month))
+        self.assertFalse(partitions.has_default_rows('feeds'))
+
+        dropped = partitions.drop_partitions_before('feeds', partitions.add_months(old_month, 1))
+        self.assertEqual(dropped, [partitions.partition_name('feeds', old_month)])
+        self.assertEqual(set(Feed.objects.values_list('id', flat=True)), {new.id, later.id})
+
+
+class DueDateReminderTests(TestCase):
+    """Assignees get one digest for the tasks due tomorrow, once"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('owner@example.com', 'password')
+        self.organization = Organization.objects.create(name='Acme', owner=self.user)
+        self.project = Project.objects.create(name='Launch', organization=self.organization, owner=self.user)
+
+    def create_task(self, title, due_in_days):
+        return Task.objects.create(
+            title=title, project=self.project, reporter=self.user, assignee=self.user,
+            due_date=timezone.now().date() + timedelta(days=due_in_days),
+        )
+
+    def test_reminds_tasks_due_tomorrow_once(self):
+        self.create_task('Today', 0)
+        self.create_task('Tomorrow', 1)
+        self.create_task('Also tomorrow', 1)
+        self.create_task('Next week', 7)
+
+        send_due_date_reminders()
+        send_due_date_reminders()
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('Also tomorrow', mail.outbox[0].body)
+        self.assertNotIn('Today', mail.outbox[0].body)
+        self.assertNotIn('Next week', mail.outbox[0].body)
+
+
+class OutboxTests(TestCase):
+    """Task changes become activity and feed rows once the outbox is drained"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('owner@example.com', 'password')
+        self.organization = Organization.objects.create(name='Acme', owner=self.user)
+        self.project = Project.objects.create(name='Launch', organization=self.organization, owner=self.user)
+        self.task = Task.objects.create(title='First', project=self.project, reporter=self.user)
+
+    def drain(self):
+        # publish() broadcasts; only check what it is handed after commit
+        with mock.patch('projects.outbox.publish') as publish, \
+                self.captureOnCommitCallbacks(execute=True):
+            drain_outbox()
+        return publish
+
+    def test_drain_creates_rows_once(self):
+        publish = self.drain()
+        self.assertEqual(ActivityLog.objects.filter(action='TASK_CREATED').count(), 1)
+        feed_item = Feed.objects.get()
+        publish.assert_called_once_with([feed_item], [])
+
+        task = Task.objects.get(pk=self.task.pk)
+        task.status = 'IN_PROGRESS'
+        task.save(actor=self.user)
+        self.assertEqual(ActivityLog.objects.filter(action='STATUS_CHANGED').count(), 0)
+
+        self.drain()
+        activity = ActivityLog.objects.get(action='STATUS_CHANGED')
+        self.assertEqual(activity.metadata, {'old_status': 'TODO', 'new_status': 'IN_PROGRESS'})
+        self.assertEqual(Feed.objects.count(), 1)
+        self.assertFalse(OutboxEvent.objects.exists())
+
+        # Nothing left to drain
+        publish = self.drain()
+        self.assertEqual(ActivityLog.objects.count(), 2)
+        self.assertEqual(Feed.objects.count(), 1)
+        publish.assert_not_called()
+
+    def test_rows_keep_the_event_time(self):
+        event_time = timezone.now() - timedelta(hours=2)
+        OutboxEvent.objects.update(created_at=event_time)
+        self.drain()
+        self.assertEqual(ActivityLog.objects.get().created_at, event_time)
+        self.assertEqual(Feed.objects.get().created_at, event_time)
+
+    def test_rows_of_deleted_tasks_are_skipped(self):
+        other = Task.objects.create(title='Second', project=self.project, reporter=self.user)
+        self.task.delete()
+        self.drain()
+        self.assertEqual(list(ActivityLog.objects.values_list('task_id', flat=True)), [other.id])
+        self.assertEqual(list(Feed.objects.values_list('task_id', flat=True)), [other.id])
+        self.assertFalse(OutboxEvent.objects.exists())
+
+
+class KeysetPaginationTests(TestCase):
+    """Cursor pages of the task list are stable when created_at ties"""
+
+    def setUp(self):
+        patcher = mock.patch.object(TaskViewSet, 'throttle_classes', [])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.user = CustomUser.objects.create_user('owner@example.com', 'password')
+        self.organization = Organization.objects.create(name='Acme', owner=self.user)
+        Membership.objects.create(user=self.user, organization=self.organization, role='ADMIN')
+        self.project = Project.objects.create(name='Launch', organization=self.organization, owner=self.user)
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_pages_over_tied_timestamps(self):
+        tasks = [
+            Task.objects.create(title=f'Task {index}', project=self.project, reporter=self.user)
+            for index in range(5)
+        ]
+        Task.objects.update(created_at=timezone.now())
+        newest = Task.objects.create(title='Newest', project=self.project, reporter=self.user)
+
+        response = self.client.get('/api/tasks/', {'cursor': '', 'page_size': 2})
+        seen = []
+        while True:
+            self.assertEqual(response.status_code, 200)
+            seen.extend(item['id'] for item in response.data['results'])
+            if response.data['next'] is None:
+                break
+            response = self.client.get(response.data['next'])
+
+        self.assertEqual(seen, [newest.id, *sorted((task.id for task in tasks), reverse=True)])
+
+    def test_malformed_cursor(self):
+        for cursor in ('not-a-cursor', 'bm90fGE=', '%%%'):
+            response = self.client.get('/api/tasks/', {'cursor': cursor})
+            self.assertEqual(response.status_code, 404, cursor)
+
+
+class BoardTests(TestCase):
+    """The board pages each status column on its own"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('owner@example.com', 'password')
+        self.organization = Organization.objects.create(name='Acme', owner=self.user)
+        self.project = Project.objects.create(name='Launch', organization=self.organization, owner=self.user)
+
+    def create_tasks(self, status, count):
+        return [
+            Task.objects.create(title=f'{status} {index}', project=self.project, reporter=self.user, status=status)
+            for index in range(count)
+        ]
+
+    def test_column_limit_and_cursor(self):
+        todo = self.create_tasks('TODO', 3)
+        in_progress = self.create_tasks('IN_PROGRESS', 1)
+
+        with self.assertNumQueries(2):
+            board = build_board(Task.objects.all(), limit=2)
+
+        self.assertEqual(board['TODO']['count'], 3)
+        self.assertEqual(board['TODO']['tasks'], [todo[2], todo[1]])
+        self.assertIsNotNone(board['TODO']['next_cursor'])
+        self.assertEqual(board['IN_PROGRESS']['tasks'], in_progress)
+        self.assertIsNone(board['IN_PROGRESS']['next_cursor'])
+        self.assertEqual(board['DONE'], {'count': 0, 'next_cursor': None, 'tasks': []})
+
+        board = build_board(
+            Task.objects.all(), columns=['TODO'], limit=2,
+            cursors={'TODO': board['TODO']['next_cursor']},
+        )
+        self.assertEqual(list(board), ['TODO'])
+        self.assertEqual(board['TODO']['tasks'], [todo[0]])
+        self.assertIsNone(board['TODO']['next_cursor'])
+
+
+class RetentionTests(TestCase):
+    """Old rows are purged in resumable batches, honoring organization overrides"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('owner@example.com', 'password')
+        self.organization = Organization.objects.create(name='Acme', owner=self.user)
+        self.key = retention.checkpoint_key('feeds')
+        self.addCleanup(cache.delete, self.key)
+
+    def create_feed(self, days_ago, organization=None):
+        return Feed.objects.create(
+            actor=self.user, activity_type='TASK_CREATED', title='Created',
+            organization=organization or self.organization,
+            created_at=timezone.now() - timedelta(days=days_ago),
+        )
+
+    def purge(self, deadline):
+        queryset = Feed.objects.filter(created_at__lt=timezone.now() - timedelta(days=30))
+        return retention.purge(queryset, self.key, batch_size=1, pause=0, deadline=deadline)
+
+    def test_purge_resumes_from_checkpoint(self):
+        old = [self.create_feed(60) for _ in range(3)]
+        recent = self.create_feed(1)
+
+        # Out of time: nothing deleted, the checkpoint stays for the next run
+        cache.set(self.key, old[0].id, None)
+        self.assertEqual(self.purge(deadline=time.monotonic()), (0, False))
+        self.assertEqual(cache.get(self.key), old[0].id)
+
+        # The next run starts after the checkpoint, then resets it
+        self.assertEqual(self.purge(deadline=time.monotonic() + 60), (2, True))
+        self.assertEqual(set(Feed.objects.values_list('id', flat=True)), {old[0].id, recent.id})
+        self.assertIsNone(cache.get(self.key))
+
+        self.assertEqual(self.purge(deadline=time.monotonic() + 60), (1, True))
+        self.assertEqual(list(Feed.objects.values_list('id', flat=True)), [recent.id])
+
+    def test_organization_overrides(self):
+        kept_longer = Organization.objects.create(name='Archive', owner=self.user)
+        forever = Organization.objects.create(name='Forever', owner=self.user)
+        self.create_feed(60)
+        recent = self.create_feed(1)
+        archived = self.create_feed(60, kept_longer)
+        self.create_feed(400, kept_longer)
+        ancient = self.create_feed(1000, forever)
+
+        results = retention.run_retention(
+            {'feeds': {'days': 30, 'organizations': {kept_longer.id: 365, forever.id: None}}},
+            pause=0,
+        )
+
+        self.assertEqual(
+            set(Feed.objects.values_list('id', flat=True)),
+            {recent.id, archived.id, ancient.id},
+        )
+        self.assertEqual(
+            {(result['organization_id'], result['deleted']) for result in results},
+            {(None, 1), (kept_longer.id, 1)},
+        )
+
+
+class FeedCachePackingTests(SimpleTestCase):
+    """Packed feed pages unpack to the page that was packed"""
+
+    def item(self, item_id, actor_id, task_id):
+        return {
+            'id': item_id, 'actor': actor_id, 'actor_email': f'user{actor_id}@example.com',
+            'actor_name': f'User {actor_id}', 'activity_type': 'TASK_UPDATED', 'title': 'Updated',
+            'task': task_id, 'task_title': f'Task {task_id}' if task_id else None,
+            'organization': 1, 'organization_name': 'Acme', 'time_ago': '1m ago',
+        }
+
+    def test_round_trip(self):
+        items = [self.item(3, 1, 7), self.item(2, 2, None), self.item(1, 1, 7)]
+        page = {'count': 3, 'next': None, 'previous': None, 'results': items}
+
+        packed = pack_page(page)
+        self.assertEqual(len(packed['items']['shared']['actor']['rows']), 2)
+        self.assertEqual(len(packed['items']['shared']['organization']['rows']), 1)
+        self.assertEqual(unpack_page(packed), page)
+        self.assertEqual(unpack_page(pack_page(items)), items)
+        self.assertEqual(unpack_page(pack_page([])), [])
+
+    def test_round_trip_through_the_feed_cache(self):
+        page = {'next': None, 'results': [self.item(1, 1, 7)]}
+        feed_cache = caches[FEED_CACHE_ALIAS]
+        self.addCleanup(feed_cache.delete, 'test_packed_page')
+
+        feed_cache.set('test_packed_page', pack_page(page), 60)
+        self.assertEqual(unpack_page(feed_cache.get('test_packed_page')), page)
+
+
+class FeedGenerationTests(SimpleTestCase):
+    """Feed generation counters expire instead of piling up in Redis"""
+
+    def test_counters_have_a_ttl(self):
+        key = generation_key('user', 'test')
+        generation_cache.delete(key)
+        self.addCleanup(generation_cache.delete, key)
+
+        version = get_feed_version(('user', 'test'))
+        self.assertTrue(0 < generation_cache.remote.ttl(key) <= FEED_GENERATION_TTL)
+
+        bump_feed_generation('user', 'test')
+        self.assertNotEqual(get_feed_version(('user', 'test')), version)
+        self.assertTrue(0 < generation_cache.remote.ttl(key) <= FEED_GENERATION_TTL)
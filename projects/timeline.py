@@ -0,0 +1,205 @@
+"""
+Materialized feed timelines (fan-out on write)
+
+Every timeline is a Redis sorted set of feed IDs scored by creation time,
+stored on the 'feed' cache alias. When the drain_outbox task inserts feed
+items, outbox.publish() pushes their IDs into the timelines that are already
+warm; readers slice a page of IDs and hydrate it with a single id__in query.
+A cold timeline is rebuilt from SQL on first read.
+"""
+from django.conf import settings
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+TIMELINE_CACHE_ALIAS = 'feed'
+TIMELINE_MAX_LENGTH = getattr(settings, 'FEED_TIMELINE_MAX_LENGTH', 1000)
+TIMELINE_TTL = getattr(settings, 'FEED_TIMELINE_TTL', 60 * 60 * 24)
+
+# Only push into timelines that exist, so a cold timeline never looks warm
+# with a single entry in it. KEYS = timelines, ARGV = score, id, max, ttl
+PUSH_SCRIPT = """
+for _, key in ipairs(KEYS) do
+    if redis.call('EXISTS', key) == 1 then
+        redis.call('ZADD', key, ARGV[1], ARGV[2])
+        redis.call('ZREMRANGEBYRANK', key, 0, -(tonumber(ARGV[3]) + 1))
+        redis.call('EXPIRE', key, ARGV[4])
+    end
+end
+return 1
+"""
+
+
+def user_timeline_key(user_id):
+    """Home timeline: everything in the user's organizations"""
+    return f'timeline:user:{user_id}'
+
+
+def actor_timeline_key(user_id):
+    """Items the user created themselves"""
+    return f'timeline:actor:{user_id}'
+
+
+def project_timeline_key(project_id):
+    return f'timeline:project:{project_id}'
+
+
+def org_timeline_key(organization_id):
+    return f'timeline:org:{organization_id}'
+
+
+def get_connection():
+    return get_redis_connection(TIMELINE_CACHE_ALIAS)
+
+
+def push_feed_item(feed_item, member_ids):
+    """
+    Fan a new feed item out to the warm timelines it belongs to
+
+    Args:
+        feed_item: The Feed instance that was just created
+        member_ids: User IDs of the organization's members
+    """
+    keys = [user_timeline_key(user_id) for user_id in member_ids]
+    keys.append(actor_timeline_key(feed_item.actor_id))
+    keys.append(org_timeline_key(feed_item.organization_id))
+    if feed_item.project_id:
+        keys.append(project_timeline_key(feed_item.project_id))
+
+    try:
+        con = get_connection()
+        con.register_script(PUSH_SCRIPT)(
+            keys=keys,
+            args=[
+                feed_item.created_at.timestamp(),
+                feed_item.id,
+                TIMELINE_MAX_LENGTH,
+                TIMELINE_TTL,
+            ],
+        )
+    except RedisError:
+        # Timelines are a cache; a missed push only costs a rebuild later
+        pass
+
+
+def drop_timelines(*keys):
+    """Forget timelines so they are rebuilt from SQL on next read"""
+    try:
+        get_connection().delete(*keys)
+    except RedisError:
+        pass
+
+
+class Timeline:
+    """
+    Sequence view over a timeline that Django's Paginator can slice
+
+    Slices read a window of IDs from Redis and hydrate them from `queryset`
+    in one id__in query, so permission scoping and select_related still
+    apply. Windows past the end of a truncated timeline fall back to SQL.
+    """
+
+    def __init__(self, key, queryset):
+        self.key = key
+        self.queryset = queryset
+        self.length = self._load()
+
+    def _load(self):
+        """Return the timeline length, rebuilding it from SQL when cold"""
+        con = get_connection()
+        length = con.zcard(self.key)
+        if length:
+            return length
+
+        rows = self._newest_rows()
+        if not rows:
+            return 0
+        self._add(con, rows)
+        # Items committed between the read and the ZADD were not pushed (the
+        # key did not exist yet); anything committed later is pushed, so
+        # reading once more after the ZADD closes the gap
+        self._add(con, self._newest_rows())
+        return con.zcard(self.key)
+
+    def _newest_rows(self):
+        return list(
+            self.queryset.order_by('-created_at', '-id')
+            .values_list('id', 'created_at')[:TIMELINE_MAX_LENGTH]
+        )
+
+    def _add(self, con, rows):
+        if not rows:
+            return
+        pipe = con.pipeline()
+        pipe.zadd(self.key, {item_id: created_at.timestamp() for item_id, created_at in rows})
+        pipe.zremrangebyrank(self.key, 0, -(TIMELINE_MAX_LENGTH + 1))
+        pipe.expire(self.key, TIMELINE_TTL)
+        pipe.execute()
+
+    @property
+    def is_complete(self):
+        return self.length < TIMELINE_MAX_LENGTH
+
+    def count(self):
+        if self.is_complete:
+            return self.length
+        return self.queryset.count()
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+
+        start = index.start or 0
+        stop = index.stop if index.stop is not None else self.count()
+        if stop > self.length and not self.is_complete:
+            return list(self.queryset[start:stop])
+        if stop <= start:
+            return []
+
+        con = get_connection()
+        ids = [int(item_id) for item_id in con.zrevrange(self.key, start, stop - 1)]
+        items = {item.id: item for item in self.queryset.filter(id__in=ids)}
+
+        # Deleted (cascade, retention) or no longer visible: prune, so the
+        # timeline's length stays the number of items its reader can see
+        gone = [item_id for item_id in ids if item_id not in items]
+        if gone:
+            con.zrem(self.key, *gone)
+            self.length -= len(gone)
+        return [items[item_id] for item_id in ids if item_id in items]
+
+
+def trim_timelines(cutoff_for_key):
+    """
+    Remove items older than a cutoff from every timeline
+
+    Args:
+        cutoff_for_key: Called with each timeline key; returns the datetime
+            before which its items were purged, or None to leave it alone
+    """
+    con = get_connection()
+    pipe = con.pipeline(transaction=False)
+    for key in con.scan_iter(match='timeline:*', count=1000):
+        key = key.decode()
+        cutoff = cutoff_for_key(key)
+        if cutoff is not None:
+            pipe.zremrangebyscore(key, '-inf', f'({cutoff.timestamp()}')
+        if len(pipe) >= 1000:
+            pipe.execute()
+    pipe.execute()
+
+
+def load_timeline(key, queryset):
+    """
+    Return a Timeline for `key`, or None when Redis is unavailable
+
+    Args:
+        key: Timeline key (see the *_timeline_key helpers)
+        queryset: Permission-scoped Feed queryset the timeline mirrors
+    """
+    try:
+        return Timeline(key, queryset)
+    except RedisError:
+        return None
@@ -1,28 +1,40 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
 from django.shortcuts import get_object_or_404
+from django.conf import settings
 from .models import Project, Task, Comment, ActivityLog, Feed
 from .serializers import (
     ProjectSerializer, TaskSerializer, TaskStatusUpdateSerializer,
     CommentSerializer, ActivityLogSerializer, FeedSerializer
 )
-from rest_framework.pagination import PageNumberPagination
+from .pagination import KeysetPagination, FeedKeysetPagination
+from .retention import oldest_retained, RETENTION_POLICIES
+from .board import build_board, BOARD_COLUMNS, BOARD_COLUMN_LIMIT, BOARD_MAX_COLUMN_LIMIT
 from .permissions import CanManageProject, CanManageTask
-from organizations.models import Membership
-from django.core.cache import cache
+from organizations.scope import get_request_scope
 from django.views.decorators.cache import cache_page
 from django.utils.decorators import method_decorator
-from core.throttling import CommentRateThrottle
+from rest_framework.utils.urls import replace_query_param
+from core.throttling import CommentRateThrottle, UserRateThrottle, OrganizationRateThrottle
+from .feed_utils import get_feed_version
+from . import feed_cache
+from .timeline import (
+    load_timeline, user_timeline_key, actor_timeline_key,
+    project_timeline_key, org_timeline_key
+)
+
+
+class EagerLoadingViewMixin:
+    """Load the relations the viewset's serializer declares it reads"""
+    
+    def eager_load(self, queryset):
+        return self.get_serializer_class().setup_eager_loading(queryset)
 
-class FeedPagination(PageNumberPagination):
-    """Custom pagination for feed"""
-    page_size = 20
-    page_size_query_param = 'page_size'
-    max_page_size = 100
 
-class ProjectViewSet(viewsets.ModelViewSet):
+class ProjectViewSet(EagerLoadingViewMixin, viewsets.ModelViewSet):
     """
     ViewSet for Project CRUD operations
     """
@@ -31,14 +43,18 @@ class ProjectViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         """Return projects for user's organizations only"""
-        user = self.request.user
+        scope = get_request_scope(self.request)
         
-        if user.is_superuser:
-            return Project.objects.all()
+        if scope.is_superuser:
+            queryset = Project.objects.all()
+        else:
+            # Filter by the organizations the user is a member of
+            queryset = Project.objects.filter(organization_id__in=scope.org_ids)
         
-        # Get all organizations where user is a member
-        user_orgs = Membership.objects.filter(user=user).values_list('organization', flat=True)
-        return Project.objects.filter(organization__in=user_orgs)
+        # Task counts come from denormalized counters or one GROUP BY here
+        if not getattr(settings, 'PROJECT_TASK_COUNTERS', False):
+            queryset = Project.annotate_task_counts(queryset)
+        return self.eager_load(queryset)
     
     def perform_create(self, serializer):
         """Set owner to current user"""
@@ -48,35 +64,34 @@ class ProjectViewSet(viewsets.ModelViewSet):
     def tasks(self, request, pk=None):
         """Get all tasks for a project"""
         project = self.get_object()
-        tasks = project.tasks.all()
+        tasks = TaskSerializer.setup_eager_loading(project.tasks.all())
         serializer = TaskSerializer(tasks, many=True)
         return Response(serializer.data)
 
 
-class TaskViewSet(viewsets.ModelViewSet):
+class TaskViewSet(EagerLoadingViewMixin, viewsets.ModelViewSet):
     """
     ViewSet for Task CRUD operations
     """
     serializer_class = TaskSerializer
     permission_classes = [IsAuthenticated, CanManageTask]
+    pagination_class = KeysetPagination
     
     def get_queryset(self):
         """Return tasks for user's organizations only"""
-        user = self.request.user
+        scope = get_request_scope(self.request)
         
-        if user.is_superuser:
-            return Task.objects.all()
+        if scope.is_superuser:
+            queryset = Task.objects.all()
+        else:
+            queryset = Task.objects.filter(project__organization_id__in=scope.org_ids)
         
-        user_orgs = Membership.objects.filter(user=user).values_list('organization', flat=True)
-        return Task.objects.filter(project__organization__in=user_orgs)
+        return self.eager_load(queryset)
     
-    from .websocket_utils import broadcast_task_update, send_notification_to_user
-
     @action(detail=True, methods=['post'])
     def update_status(self, request, pk=None):
         """Update task status with validation"""
         task = self.get_object()
-        old_status = task.status
         
         serializer = TaskStatusUpdateSerializer(
             data=request.data,
@@ -84,47 +99,9 @@ class TaskViewSet(viewsets.ModelViewSet):
         )
         
         if serializer.is_valid():
+            # Activity log, broadcast and assignee notification are recorded by save
             task.status = serializer.validated_data['status']
-            task.save()
-            
-            # Create activity log
-            ActivityLog.objects.create(
-                actor=request.user,
-                action='STATUS_CHANGED',
-                description=f'Changed status from {old_status} to {task.status}',
-                task=task,
-                project=task.project,
-                metadata={
-                    'old_status': old_status,
-                    'new_status': task.status,
-                }
-            )
-            
-            # Broadcast status change via WebSocket
-            broadcast_task_update(
-                task.id,
-                'status_changed',
-                {
-                    'task_id': task.id,
-                    'old_status': old_status,
-                    'new_status': task.status,
-                    'changed_by': request.user.email,
-                }
-            )
-            
-            # Notify assignee if different from actor
-            if task.assignee and task.assignee != request.user:
-                send_notification_to_user(
-                    task.assignee.id,
-                    'task_status_changed',
-                    {
-                        'task_id': task.id,
-                        'task_title': task.title,
-                        'old_status': old_status,
-                        'new_status': task.status,
-                        'changed_by': request.user.email,
-                    }
-                )
+            task.save(actor=request.user)
             
             return Response({
                 'message': 'Status updated successfully',
@@ -136,22 +113,87 @@ class TaskViewSet(viewsets.ModelViewSet):
     def my_tasks(self, request):
         """Get tasks assigned to current user"""
         tasks = self.get_queryset().filter(assignee=request.user)
+        page = self.paginate_queryset(tasks)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        
         serializer = self.get_serializer(tasks, many=True)
         return Response(serializer.data)
     
     @action(detail=False, methods=['get'])
     def by_status(self, request):
-        """Get tasks grouped by status"""
+        """
+        Get tasks grouped by status
+        
+        Kept for older clients: returns the first page of each board column
+        as a plain list. Use board for column counts and paging.
+        """
+        board = self.load_board(request)
+        return Response({
+            column_status: TaskSerializer(column['tasks'], many=True).data
+            for column_status, column in board.items()
+        })
+    
+    @action(detail=False, methods=['get'])
+    def board(self, request):
+        """
+        Get a board of tasks grouped by status
+        
+        Query params:
+            project: Limit the board to one project
+            status: Comma-separated columns to return (default: all)
+            limit: Tasks per column (default 20, max 100)
+            cursor_<STATUS>: Continue that column from a previous next link
+        """
+        board = self.load_board(request)
+        url = request.build_absolute_uri()
+        columns = {}
+        for column_status, column in board.items():
+            next_link = None
+            if column['next_cursor']:
+                next_link = replace_query_param(url, 'status', column_status)
+                next_link = replace_query_param(next_link, f'cursor_{column_status}', column['next_cursor'])
+            columns[column_status] = {
+                'count': column['count'],
+                'next': next_link,
+                'results': TaskSerializer(column['tasks'], many=True).data,
+            }
+        return Response(columns)
+    
+    def load_board(self, request):
+        """Build the board described by the query params"""
         queryset = self.get_queryset()
-        grouped_tasks = {
-            'TODO': TaskSerializer(queryset.filter(status='TODO'), many=True).data,
-            'IN_PROGRESS': TaskSerializer(queryset.filter(status='IN_PROGRESS'), many=True).data,
-            'DONE': TaskSerializer(queryset.filter(status='DONE'), many=True).data,
+        
+        project_id = request.query_params.get('project')
+        if project_id is not None:
+            if not project_id.isdigit():
+                raise ValidationError({'error': 'project must be an integer'})
+            queryset = queryset.filter(project_id=project_id)
+        
+        columns = BOARD_COLUMNS
+        if request.query_params.get('status'):
+            columns = request.query_params['status'].split(',')
+            if not set(columns) <= set(BOARD_COLUMNS):
+                raise ValidationError({'error': f'status must be one of {", ".join(BOARD_COLUMNS)}'})
+        
+        limit = request.query_params.get('limit', str(BOARD_COLUMN_LIMIT))
+        if not limit.isdigit() or int(limit) == 0:
+            raise ValidationError({'error': 'limit must be a positive integer'})
+        
+        cursors = {
+            column_status: request.query_params.get(f'cursor_{column_status}')
+            for column_status in columns
         }
-        return Response(grouped_tasks)
+        return build_board(
+            queryset,
+            columns=columns,
+            limit=min(int(limit), BOARD_MAX_COLUMN_LIMIT),
+            cursors=cursors,
+        )
 
 
-class CommentViewSet(viewsets.ModelViewSet):
+class CommentViewSet(EagerLoadingViewMixin, viewsets.ModelViewSet):
     """
     ViewSet for Comment CRUD operations
     """
@@ -161,13 +203,14 @@ class CommentViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         """Return comments for tasks in user's organizations"""
-        user = self.request.user
+        scope = get_request_scope(self.request)
         
-        if user.is_superuser:
-            return Comment.objects.all()
+        if scope.is_superuser:
+            queryset = Comment.objects.all()
+        else:
+            queryset = Comment.objects.filter(task__project__organization_id__in=scope.org_ids)
         
-        user_orgs = Membership.objects.filter(user=user).values_list('organization', flat=True)
-        return Comment.objects.filter(task__project__organization__in=user_orgs)
+        return self.eager_load(queryset)
     
     @action(detail=False, methods=['get'])
     def task_comments(self, request):
@@ -184,22 +227,24 @@ class CommentViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class ActivityLogViewSet(viewsets.ReadOnlyModelViewSet):
+class ActivityLogViewSet(EagerLoadingViewMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for Activity Logs (read-only)
     """
     serializer_class = ActivityLogSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
     
     def get_queryset(self):
         """Return activity logs for user's organizations"""
-        user = self.request.user
+        scope = get_request_scope(self.request)
         
-        if user.is_superuser:
-            return ActivityLog.objects.all()
+        if scope.is_superuser:
+            queryset = ActivityLog.objects.all()
+        else:
+            queryset = ActivityLog.objects.filter(project__organization_id__in=scope.org_ids)
         
-        user_orgs = Membership.objects.filter(user=user).values_list('organization', flat=True)
-        return ActivityLog.objects.filter(project__organization__in=user_orgs)
+        return self.eager_load(queryset)
     
     @action(detail=False, methods=['get'])
     def task_activity(self, request):
@@ -212,6 +257,11 @@ class ActivityLogViewSet(viewsets.ReadOnlyModelViewSet):
             )
         
         activities = self.get_queryset().filter(task_id=task_id)
+        page = self.paginate_queryset(activities)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        
         serializer = self.get_serializer(activities, many=True)
         return Response(serializer.data)
     
@@ -226,6 +276,11 @@ class ActivityLogViewSet(viewsets.ReadOnlyModelViewSet):
             )
         
         activities = self.get_queryset().filter(project_id=project_id)
+        page = self.paginate_queryset(activities)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        
         serializer = self.get_serializer(activities, many=True)
         return Response(serializer.data)
     
@@ -233,91 +288,129 @@ class ActivityLogViewSet(viewsets.ReadOnlyModelViewSet):
     def my_activity(self, request):
         """Get current user's activity"""
         activities = self.get_queryset().filter(actor=request.user)
+        page = self.paginate_queryset(activities)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        
         serializer = self.get_serializer(activities, many=True)
         return Response(serializer.data)
-class FeedViewSet(viewsets.ReadOnlyModelViewSet):
+class FeedViewSet(EagerLoadingViewMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for Feed (read-only, paginated timeline)
     """
     serializer_class = FeedSerializer
     permission_classes = [IsAuthenticated]
-    pagination_class = FeedPagination
+    pagination_class = FeedKeysetPagination
     
     def get_queryset(self):
         """
         Return feed items for user's organizations
-        Optimized with select_related and prefetch_related
+        Optimized with the relations FeedSerializer declares
         """
-        user = self.request.user
-        
-        # Create cache key based on user and organizations
-        cache_key = f'feed_queryset_user_{user.id}'
+        scope = get_request_scope(self.request)
         
-        # Try to get from cache
-        cached_queryset = cache.get(cache_key)
-        if cached_queryset is not None:
-            return cached_queryset
-        
-        if user.is_superuser:
+        if scope.is_superuser:
             queryset = Feed.objects.all()
         else:
-            user_orgs = Membership.objects.filter(user=user).values_list('organization', flat=True)
-            queryset = Feed.objects.filter(organization__in=user_orgs)
+            queryset = Feed.objects.filter(organization_id__in=scope.org_ids)
+        
+        # Nothing older survives retention; the bound lets the planner skip
+        # expired monthly partitions
+        oldest = oldest_retained(RETENTION_POLICIES.get('feeds'))
+        if oldest is not None:
+            queryset = queryset.filter(created_at__gte=oldest)
         
         # Optimize queries - load related objects in one query
-        queryset = queryset.select_related(
-            'actor',
-            'task',
-            'project',
-            'comment',
-            'organization'
+        return self.eager_load(queryset)
+    
+    def get_timeline(self, key, queryset, allowed=True):
+        """
+        Serve `queryset` from a materialized timeline when one is available
+        Falls back to the plain SQL queryset for superusers, keyset pages
+        (already an index range scan) or when Redis is down. Org and project
+        timelines are shared by all members, so callers pass `allowed` only
+        for members; anyone else gets the scoped queryset, so not even the
+        timeline's length leaks across tenants.
+        """
+        if self.request.user.is_superuser or self.paginator.is_keyset_request(self.request):
+            return queryset
+        if not allowed:
+            return queryset
+        
+        timeline = load_timeline(key, queryset)
+        return timeline if timeline is not None else queryset
+    
+    def page_cache_key(self, prefix, *scopes, shared=False):
+        """
+        Cache key for one page of a feed endpoint
+        Embeds the generation of every scope the page depends on, plus the
+        user's own (bumped on membership changes) unless the page is
+        `shared` by everyone allowed to see it. Keyset pages are cheap
+        and never cached, so they get no key.
+        """
+        if self.paginator.is_keyset_request(self.request):
+            return None
+        
+        params = self.request.query_params
+        if not shared:
+            user_id = self.request.user.id
+            prefix = f"{prefix}_user_{user_id}"
+            scopes = (('user', user_id),) + scopes
+        version = get_feed_version(*scopes)
+        return (
+            f"{prefix}_v{version}"
+            f"_page_{params.get('page', 1)}_size_{params.get('page_size', '')}"
         )
+    
+    def cached_page(self, cache_key, timeout, build):
+        """
+        Return build() through the feed page cache
+        Concurrent misses on one key run build() once (see core.cache)
+        """
+        if cache_key is None:
+            return build()
+        return feed_cache.get_or_build_page(cache_key, build, timeout)
+    
+    def paginated_data(self, results):
+        """Serialize one page of `results` (a queryset or timeline)"""
+        page = self.paginate_queryset(results)
         
-        # Cache for 5 minutes
-        cache.set(cache_key, queryset, 300)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data).data
         
-        return queryset
+        serializer = self.get_serializer(results, many=True)
+        return serializer.data
     
     def list(self, request, *args, **kwargs):
         """Override list to add caching"""
-        # Cache key includes page number
-        page = request.query_params.get('page', 1)
-        cache_key = f'feed_list_user_{request.user.id}_page_{page}'
-        
-        # Try cache first
-        cached_response = cache.get(cache_key)
-        if cached_response is not None:
-            return Response(cached_response)
-        
-        # If not cached, get data normally
-        response = super().list(request, *args, **kwargs)
-        
-        # Cache the response for 5 minutes
-        cache.set(cache_key, response.data, 300)
-        
-        return response
+        # Cache key includes page number and every organization's generation
+        scope = get_request_scope(request)
+        if scope.is_superuser:
+            scopes = [('site', 0)]
+        else:
+            scopes = [('org', org_id) for org_id in scope.org_ids]
+        cache_key = self.page_cache_key('feed_list', *scopes)
+        
+        # On a miss, read the user's home timeline; cache for 5 minutes
+        data = self.cached_page(cache_key, 300, lambda: self.paginated_data(
+            self.get_timeline(user_timeline_key(request.user.id), self.get_queryset())
+        ))
+        return Response(data)
     
     @action(detail=False, methods=['get'])
     def my_feed(self, request):
         """Get feed items for current user's activity"""
-        cache_key = f'my_feed_user_{request.user.id}'
-        
-        cached_data = cache.get(cache_key)
-        if cached_data is not None:
-            return Response(cached_data)
-        
-        queryset = self.get_queryset().filter(actor=request.user)
-        page = self.paginate_queryset(queryset)
+        cache_key = self.page_cache_key('my_feed')
         
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            result = self.get_paginated_response(serializer.data)
-            cache.set(cache_key, result.data, 300)
-            return result
-        
-        serializer = self.get_serializer(queryset, many=True)
-        cache.set(cache_key, serializer.data, 300)
-        return Response(serializer.data)
+        data = self.cached_page(cache_key, 300, lambda: self.paginated_data(
+            self.get_timeline(
+                actor_timeline_key(request.user.id),
+                self.get_queryset().filter(actor=request.user)
+            )
+        ))
+        return Response(data)
     
     @action(detail=False, methods=['get'])
     def project_feed(self, request):
@@ -328,27 +421,27 @@ class FeedViewSet(viewsets.ReadOnlyModelViewSet):
                 {'error': 'project_id parameter is required'},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        if not project_id.isdigit():
+            return Response(
+                {'error': 'project_id must be an integer'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        cache_key = f'project_feed_{project_id}_user_{request.user.id}'
-        
-        cached_data = cache.get(cache_key)
-        if cached_data is not None:
-            return Response(cached_data)
-        
-        queryset = self.get_queryset().filter(project_id=project_id)
-        page = self.paginate_queryset(queryset)
+        cache_key = self.page_cache_key(f'project_feed_{project_id}', ('project', project_id))
         
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            result = self.get_paginated_response(serializer.data)
-            cache.set(cache_key, result.data, 600)
-            return result
-        
-        serializer = self.get_serializer(queryset, many=True)
-        cache.set(cache_key, serializer.data, 600)
-        return Response(serializer.data)
+        scope = get_request_scope(request)
+        data = self.cached_page(cache_key, 600, lambda: self.paginated_data(
+            self.get_timeline(
+                project_timeline_key(project_id),
+                self.get_queryset().filter(project_id=project_id),
+                allowed=Project.objects.filter(
+                    id=project_id, organization_id__in=scope.org_ids
+                ).exists()
+            )
+        ))
+        return Response(data)
     
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], throttle_classes=[UserRateThrottle, OrganizationRateThrottle])
     def organization_feed(self, request):
         """Get feed items for a specific organization"""
         org_id = request.query_params.get('org_id')
@@ -357,22 +450,24 @@ class FeedViewSet(viewsets.ReadOnlyModelViewSet):
                 {'error': 'org_id parameter is required'},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        if not org_id.isdigit():
+            return Response(
+                {'error': 'org_id must be an integer'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        cache_key = f'org_feed_{org_id}_user_{request.user.id}'
-        
-        cached_data = cache.get(cache_key)
-        if cached_data is not None:
-            return Response(cached_data)
-        
-        queryset = self.get_queryset().filter(organization_id=org_id)
-        page = self.paginate_queryset(queryset)
-        
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            result = self.get_paginated_response(serializer.data)
-            cache.set(cache_key, result.data, 600)
-            return result
-        
-        serializer = self.get_serializer(queryset, many=True)
-        cache.set(cache_key, serializer.data, 600)
-        return Response(serializer.data)
\ No newline at end of file
+        # Every member sees the same page, so members share one cache entry
+        # and a miss after new activity costs one query, not one per member
+        scope = get_request_scope(request)
+        is_member = scope.role_in(int(org_id)) is not None
+        shared = scope.is_superuser or is_member
+        cache_key = self.page_cache_key(f'org_feed_{org_id}', ('org', org_id), shared=shared)
+        
+        data = self.cached_page(cache_key, 600, lambda: self.paginated_data(
+            self.get_timeline(
+                org_timeline_key(org_id),
+                self.get_queryset().filter(organization_id=org_id),
+                allowed=is_member
+            )
+        ))
+        return Response(data)
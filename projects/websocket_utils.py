@@ -1,5 +1,64 @@
+import asyncio
+import threading
+from contextlib import contextmanager
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
+from django.db import connection, transaction
+
+_batch = threading.local()
+
+
+async def _group_send_all(channel_layer, messages):
+    await asyncio.gather(*(
+        channel_layer.group_send(group, message) for group, message in messages
+    ))
+
+
+def publish_many(messages):
+    """
+    Send (group, message) pairs to the channel layer
+    
+    All sends share one async_to_sync call and run concurrently on its
+    event loop, instead of paying the sync-to-async round trip per message.
+    """
+    if not messages:
+        return
+    async_to_sync(_group_send_all)(get_channel_layer(), messages)
+
+
+def publish(group, message):
+    """Send a message to a group now, or at the end of the open batch"""
+    pending = getattr(_batch, 'messages', None)
+    if pending is not None:
+        pending.append((group, message))
+    else:
+        publish_many([(group, message)])
+
+
+@contextmanager
+def batched():
+    """
+    Buffer every publish() in the block and send them together at the end
+    
+    Inside a transaction the buffer is sent once it commits, and dropped if
+    the block raises. Nested blocks join the outer batch.
+    """
+    if getattr(_batch, 'messages', None) is not None:
+        yield
+        return
+    
+    _batch.messages = []
+    try:
+        yield
+    except BaseException:
+        _batch.messages = None
+        raise
+    
+    messages, _batch.messages = _batch.messages, None
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: publish_many(messages))
+    else:
+        publish_many(messages)
 
 
 def send_notification_to_user(user_id, notification_type, data):
@@ -11,8 +70,7 @@ def send_notification_to_user(user_id, notification_type, data):
         notification_type: Type of notification (task_assigned, comment_added, etc.)
         data: Notification data (dict)
     """
-    channel_layer = get_channel_layer()
-    async_to_sync(channel_layer.group_send)(
+    publish(
         f'notifications_{user_id}',
         {
             'type': 'notification_message',
@@ -33,11 +91,11 @@ def broadcast_task_update(task_id, update_type, data):
         update_type: Type of update (status_changed, comment_added, etc.)
         data: Update data (dict)
     """
-    channel_layer = get_channel_layer()
-    async_to_sync(channel_layer.group_send)(
+    publish(
         f'task_{task_id}',
         {
             'type': update_type,
+            'task_id': task_id,
             'data': data,
         }
     )
@@ -51,11 +109,25 @@ def broadcast_feed_update(organization_id, activity_data):
         organization_id: ID of the organization
         activity_data: Activity data (dict)
     """
-    channel_layer = get_channel_layer()
-    async_to_sync(channel_layer.group_send)(
+    publish(
         f'feed_org_{organization_id}',
         {
             'type': 'feed_update',
+            'organization_id': organization_id,
             'data': activity_data,
         }
-    )
\ No newline at end of file
+    )
+
+def notify_membership_changed(user_id):
+    """
+    Tell the user's open feed sockets to re-read their organizations
+    
+    Args:
+        user_id: ID of the user who joined or left an organization
+    """
+    publish(
+        f'feed_user_{user_id}',
+        {
+            'type': 'membership_changed',
+        }
+    )
@@ -0,0 +1,11 @@
+from django.conf import settings
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from .views import profile_cache, profile_cache_key
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def reset_user_profile(sender, instance, created, **kwargs):
+    """Drop the cached profile, in every process, when a user is saved"""
+    if not created:
+        profile_cache.delete(profile_cache_key(instance.id))
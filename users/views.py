@@ -5,10 +5,17 @@ from rest_framework_simplejwt.views import TokenObtainPairView
 from django.contrib.auth import get_user_model
 from core.throttling import LoginRateThrottle
 from .serializers import UserRegistrationSerializer, UserSerializer
-from django.core.cache import cache
+from core.cache import TwoTierCache
 
 User = get_user_model()
 
+PROFILE_CACHE_TIMEOUT = 900
+profile_cache = TwoTierCache('user_profile')
+
+
+def profile_cache_key(user_id):
+    return f'user_profile_{user_id}'
+
 
 class RegisterView(generics.CreateAPIView):
     """API endpoint for user registration"""
@@ -35,21 +42,13 @@ class UserProfileView(generics.RetrieveAPIView):
     
     def retrieve(self, request, *args, **kwargs):
         """Override retrieve to add caching"""
-        cache_key = f'user_profile_{request.user.id}'
-        
-        # Try cache first
-        cached_data = cache.get(cache_key)
-        if cached_data is not None:
-            return Response(cached_data)
-        
-        # If not cached, get data normally
-        instance = self.get_object()
-        serializer = self.get_serializer(instance)
-        
-        # Cache for 15 minutes
-        cache.set(cache_key, serializer.data, 900)
-        
-        return Response(serializer.data)
+        # Process memory, then Redis; concurrent misses serialize once
+        data = profile_cache.get_or_fill(
+            profile_cache_key(request.user.id),
+            lambda: self.get_serializer(self.get_object()).data,
+            PROFILE_CACHE_TIMEOUT
+        )
+        return Response(data)
 
 
 # Custom login view with rate limiting